@@ -0,0 +1,234 @@
+# cleaner.py
+import itertools
+import yaml
+import numpy as np
+from pipeline import single_corpus_kwargs, resolve_languages, GLOTLID_INV, ALIASES
+from steps import embeddings, filtering, deduplicate, dedup_index, normalisation, semantic_dedup, cap_repeats, decontaminate
+from steps.fileio import tsv_line
+from steps.langid import LangResolver
+from steps.langid.langid import load_detector, score_lines
+
+# In-memory counterpart of run_pipeline for cleaning pairs from Python code:
+#
+#	cleaner = Cleaner("config_single.yaml")
+#	for l1_sent, l2_sent, scores in cleaner.process(pairs):
+#		...
+#
+# Models and indexes are loaded once, when the Cleaner is created, and reused
+# by every process() call. Rows are kept as TSV lines and every step calls the
+# same per-line code as its file-based version, so a call cleans its pairs
+# exactly like pipeline.py cleans a corpus holding the same pairs. embeddings
+# and langid take the rows in blocks of MODEL_BATCH and score each block with
+# one model call per side. Unlike the files, the score columns that filter and
+# normalise drop are kept aside, so every surviving pair keeps its scores.
+
+IN_MEMORY_STEPS = {"input", "embeddings", "langid", "filter", "dedup", "semantic_dedup",
+				   "cap_repeats", "decontaminate", "normalise"}
+NORMALISED_COLUMNS = normalisation.NORMALISED_HEADER.split("\t")
+MODEL_BATCH = 1024
+
+
+class Cleaner:
+
+	def __init__(self, config, resolver=None):
+		"""
+		config: a single-corpus config (dict or YAML path); input, output and
+		the file settings are ignored. Language names are resolved to GlotLID
+		codes with resolver (default: the pipeline's inventory).
+		"""
+		if isinstance(config, str):
+			with open(config, "r", encoding="utf-8") as f:
+				config = yaml.safe_load(f)
+		config = resolve_languages(dict(config), resolver or LangResolver(GLOTLID_INV, ALIASES))
+		self.options = single_corpus_kwargs(dict(config, output=config.get("output")))
+		self.steps = [s for s in self.options["steps"] if s != "input"]
+
+		unsupported = [s for s in self.steps if s not in IN_MEMORY_STEPS]
+		if unsupported:
+			raise ValueError(f"Steps {unsupported} only run from files; use pipeline.py for them")
+		if self.options["dedup_index_update"]:
+			raise ValueError("dedup_index_update is not supported in memory; use pipeline.py to update the index")
+		if self.options["decontaminate_mode"] not in ("drop", "flag"):
+			raise ValueError(f"Unsupported decontamination mode: {self.options['decontaminate_mode']}")
+
+		o = self.options
+		self.model = self.detector = self.normalisers = self.eval_index = self.index = None
+		if "embeddings" in self.steps:
+			self.model = embeddings.load_embedding_model(o["model"], o["model_path"])
+		if "langid" in self.steps:
+			self.detector = load_detector()
+		if "normalise" in self.steps:
+			self.normalisers = (normalisation.get_normaliser(o["l1"]), normalisation.get_normaliser(o["l2"]))
+		if "decontaminate" in self.steps:
+			if not o["eval_sets"]:
+				raise ValueError("decontaminate needs eval_sets: the evaluation files to check the pairs against")
+			self.eval_index = decontaminate.build_index(o["eval_sets"], o["decontaminate_ngram"])
+		if "dedup" in self.steps and o["dedup_index"]:
+			self.index = dedup_index.HashIndex(o["dedup_index"], o["dedup_index_version"])
+
+	def process(self, pairs):
+		"""
+		Clean an iterable of (l1, l2) sentence pairs and yield (l1, l2, scores)
+		for every pair that survives, scores being a dict of the score columns
+		(e.g. cosine_similarity, l1_prob, l2_prob). l1 and l2 are the sentences
+		as given (process_tagged also returns the normalised ones).
+		Row-wise steps stream the pairs; dedup, semantic_dedup and cap_repeats
+		first collect every pair that reaches them, since they compare each
+		pair with all others. Each call is cleaned as one corpus.
+		"""
+		for _, text, scores in self.process_tagged((None, a, b) for a, b in pairs):
+			yield text["l1"], text["l2"], scores
+
+	def process_tagged(self, items):
+		"""
+		process() for (tag, l1, l2) items: yields (tag, text, scores), so a
+		caller can tell which of its pairs survived. text holds the pair as
+		"l1" and "l2" and, after normalise, the normalised sentences as
+		"l1_norm" and "l2_norm"; scores holds only score columns.
+		"""
+		header = f"{self.options['l1']}\t{self.options['l2']}"
+		rows = self._input(items)
+		for step in self.steps:
+			header, rows = getattr(self, "_" + step)(header, rows)
+
+		normalised = header.split("\t")[:4] == NORMALISED_COLUMNS
+		for line, _, (tag, kept) in rows:
+			fields = line.split("\t")
+			if normalised:
+				text = {"l1": fields[0], "l2": fields[2], "l1_norm": fields[1], "l2_norm": fields[3]}
+			else:
+				text = {"l1": fields[0], "l2": fields[1]}
+			scores = {**kept, **_scores(header, line)}
+			yield tag, text, {name: _number(value) for name, value in scores.items()}
+
+	# Each step maps (header, rows) to its output header and rows, where rows
+	# iterates (line, pair_vector, (tag, kept_scores)) tuples; pair_vector is
+	# set by embeddings when semantic_dedup needs it, and kept_scores holds
+	# the score columns a step dropped from the line.
+
+	def _input(self, items):
+		for tag, l1_sent, l2_sent in items:
+			l1_sent, l2_sent = l1_sent.strip(), l2_sent.strip()
+			if l1_sent == '' or l2_sent == '':
+				continue
+			yield tsv_line([l1_sent, l2_sent]), None, (tag, {})
+
+	def _embeddings(self, header, rows):
+		o = self.options
+
+		def scored():
+			for start, block in _blocks(rows):
+				results = embeddings.embed_lines([line for line, _, _ in block], self.model,
+												 o["l1"], o["l2"], start)
+				for (_, _, tag), result in zip(block, results):
+					if result is not None:
+						out_line, emb1, emb2 = result
+						yield out_line, embeddings.pair_vector(emb1, emb2) if o["save_vectors"] else None, tag
+
+		return header + "\tcosine_similarity", scored()
+
+	def _langid(self, header, rows):
+		o = self.options
+
+		def scored():
+			for start, block in _blocks(rows):
+				out_lines = score_lines([line for line, _, _ in block], self.detector, o["l1"], o["l2"], start)
+				for (_, vector, tag), out_line in zip(block, out_lines):
+					if out_line is not None:
+						yield out_line, vector, tag
+
+		return header + "\tl1_prob\tl2_prob", scored()
+
+	def _filter(self, header, rows):
+		o = self.options
+
+		def kept():
+			for line_number, (line, vector, tag) in enumerate(rows, start=2):
+				out_line = filtering.filter_line(line, o["alignment"], o["langid_l1"], o["langid_l2"], line_number)
+				if out_line is not None:
+					yield out_line, vector, _keep_scores(tag, header, line)
+
+		return "\t".join(header.split("\t")[:2]), kept()
+
+	def _normalise(self, header, rows):
+		l1_norm, l2_norm = self.normalisers
+
+		def normalised():
+			for line_number, (line, vector, tag) in enumerate(rows, start=1):
+				out_line = normalisation.normalise_line(line, l1_norm, l2_norm, line_number)
+				if out_line is not None:
+					yield out_line, vector, _keep_scores(tag, header, line)
+
+		return normalisation.NORMALISED_HEADER, normalised()
+
+	def _decontaminate(self, header, rows):
+		flag = self.options["decontaminate_mode"] == "flag"
+		rows, passed = itertools.tee(rows)
+		checked = decontaminate.flag_lines((line for line, _, _ in rows), *self.eval_index,
+										   self.options["decontaminate_ngram"])
+
+		def kept():
+			for (line, is_hit), (_, vector, tag) in zip(checked, passed):
+				if flag:
+					yield f"{line}\t{int(is_hit)}", vector, tag
+				elif not is_hit:
+					yield line, vector, tag
+
+		return header + ("\tcontaminated" if flag else ""), kept()
+
+	def _dedup(self, header, rows):
+		rows = list(rows)
+		survivors = deduplicate.dedup_lines([line for line, _, _ in rows], self.index,
+											self.options["dedup_preserve_order"])
+		return header, (rows[i] for i in survivors)
+
+	def _semantic_dedup(self, header, rows):
+		rows = list(rows)
+		if not rows:
+			return header, iter(rows)
+		if any(vector is None for _, vector, _ in rows):
+			raise ValueError("semantic_dedup needs the pair vectors of an earlier embeddings step")
+		scores = semantic_dedup.parse_scores(header, [line for line, _, _ in rows])
+		keep = semantic_dedup.representatives(np.stack([vector for _, vector, _ in rows]), scores,
+											  self.options["semantic_threshold"])
+		return header, (row for row, is_kept in zip(rows, keep) if is_kept)
+
+	def _cap_repeats(self, header, rows):
+		rows = list(rows)
+		lines = [line for line, _, _ in rows]
+		cap_repeats.has_score_column(header, "cosine_similarity")
+		dropped, _ = cap_repeats.capped_rows(
+			lambda: cap_repeats.row_keys(header, lines, "cosine_similarity"), self.options["max_repeats"])
+		return header, (row for i, row in enumerate(rows) if i not in dropped)
+
+
+def _scores(header, line):
+	"""The score columns of a line: everything after its sentence columns."""
+	names = header.split("\t")
+	n_text = 4 if names[:4] == NORMALISED_COLUMNS else 2
+	return dict(zip(names[n_text:], line.split("\t")[n_text:]))
+
+
+def _keep_scores(tag, header, line):
+	"""tag with the score columns of line added to its kept scores, for a step that drops them."""
+	tag, kept = tag
+	return tag, {**kept, **_scores(header, line)}
+
+
+def _blocks(rows, size=MODEL_BATCH):
+	"""Split rows into lists of up to size rows, with the TSV line number of each first row."""
+	rows = iter(rows)
+	start = 2
+	while True:
+		block = list(itertools.islice(rows, size))
+		if not block:
+			return
+		yield start, block
+		start += len(block)
+
+
+def _number(value):
+	try:
+		return float(value)
+	except ValueError:
+		return value
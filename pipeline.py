@@ -1,13 +1,68 @@
 # pipeline.py
 import argparse
+import json
 import yaml
 import os
+import sys
+import glob
+import shutil
 import subprocess
-from steps import input_formats, embeddings, langid, filtering, deduplicate, normalisation, bifixer
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from steps import input_formats, embeddings, langid, filtering, deduplicate, normalisation, bifixer, semantic_dedup, cap_repeats, decontaminate, fileio, step_cache, checkpoint, delta
 from steps.langid import LangResolver
 
-MERGED_STEPS = {"dedup", "filter", "normalise", "bifixer"}
-PER_CORPUS_STEPS = {"input", "embeddings", "langid"}
+MERGED_STEPS = {"dedup", "semantic_dedup", "cap_repeats", "decontaminate", "filter", "normalise", "bifixer"}
+PER_CORPUS_STEPS = {"input", "embeddings", "langid", "semantic_dedup"}
+# steps that keep rows aligned with the pair vectors written by embeddings
+VECTOR_ALIGNED_STEPS = {"embeddings", "langid"}
+# what a step's output depends on besides its input file (see step_cache)
+STEP_PARAMS = {
+	"input": ["format", "l1", "l2", "l1_column", "l2_column", "score_columns"],
+	"embeddings": ["l1", "l2", "save_vectors"],  # plus the model identity, see step_params
+	"langid": ["l1", "l2"],
+	"filter": ["alignment", "langid_l1", "langid_l2"],
+	"dedup": ["dedup_index", "dedup_index_version", "dedup_preserve_order"],
+	"semantic_dedup": ["semantic_threshold", "model", "save_vectors"],
+	"cap_repeats": ["max_repeats"],
+	"decontaminate": ["decontaminate_mode", "decontaminate_ngram"],
+	"normalise": ["l1", "l2"],
+	"bifixer": ["l1", "l2", "bifixer_flags"],
+}
+STEP_CODE = {
+	"input": input_formats.run,
+	"embeddings": embeddings.add_embeddings,
+	"langid": langid.score,
+	"filter": filtering.apply_filters,
+	"dedup": deduplicate.deduplicate_tsv,
+	"semantic_dedup": semantic_dedup.semantic_dedup,
+	"cap_repeats": cap_repeats.cap_repeats,
+	"decontaminate": decontaminate.decontaminate,
+	"normalise": normalisation.apply_normalisation,
+	"bifixer": bifixer.run,
+}
+# column steps keep every row and append score columns computed from the
+# sentence columns they need, so steps that do not depend on each other can
+# run side by side on the same input
+STEP_COLUMNS = {
+	"embeddings": {"needs": ["l1", "l2"], "adds": ["cosine_similarity"]},
+	"langid": {"needs": ["l1", "l2"], "adds": ["l1_prob", "l2_prob"]},
+}
+# row-wise steps that can run on row ranges of a corpus independently
+SHARDABLE_STEPS = {"embeddings", "langid", "filter", "normalise"}
+STEP_SUFFIXES = {
+	"input": ".formatted.tsv",
+	"embeddings": ".embeddings.tsv",
+	"langid": ".langid.tsv",
+	"filter": ".filtered.tsv",
+	"dedup": ".deduped.tsv",
+	"semantic_dedup": ".semdedup.tsv",
+	"cap_repeats": ".capped.tsv",
+	"decontaminate": ".decontaminated.tsv",
+	"normalise": ".normalised.tsv",
+	"bifixer": ".bifixer.tsv"
+}
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UTILS = os.path.join(BASE_DIR, "utils")
 
@@ -22,6 +77,16 @@ def run_pipeline_from_config(config, resolver=None):
 	Entry point for running the pipeline from a config dict.
 	Handles both single-corpus and multi-corpus modes.
 	"""
+	resolve_languages(config, resolver)
+
+	if not config.get("inputs"):
+		return run_single_corpus(config)
+
+	return run_multi_corpus(config)
+
+
+def resolve_languages(config, resolver=None):
+	"""Replace the config's language names by GlotLID codes, in place."""
 	if resolver:
 		def _resolve_field(val):
 			if not val:
@@ -42,16 +107,12 @@ def run_pipeline_from_config(config, resolver=None):
 				inp["l1"] = _resolve_field(inp.get("l1"))
 			if inp.get("l2"):
 				inp["l2"] = _resolve_field(inp.get("l2"))
+	return config
 
-	if not config.get("inputs"):
-		return run_single_corpus(config)
 
-	return run_multi_corpus(config)
-
-
-def run_single_corpus(config):
-	ensure_dir(os.path.dirname(config["output"]))
-	return run_pipeline(
+def single_corpus_kwargs(config):
+	"""run_pipeline arguments of a single-corpus config."""
+	return dict(
 		input_path=config.get("input"),
 		output_path=config["output"],
 		steps=config.get("steps", []),
@@ -64,30 +125,385 @@ def run_single_corpus(config):
 		model=config.get("model", "labse"),
 		model_path=config.get("model_path"),
 		start_from=config.get("start_from"),
-		bifixer_flags=config.get("bifixer_flags", None)
+		bifixer_flags=config.get("bifixer_flags", None),
+		save_vectors="semantic_dedup" in config.get("steps", []),
+		semantic_threshold=config.get("semantic_threshold", 0.95),
+		dedup_index=config.get("dedup_index"),
+		dedup_index_update=config.get("dedup_index_update", False),
+		dedup_index_version=config.get("dedup_index_version"),
+		dedup_preserve_order=config.get("dedup_preserve_order", False),
+		max_repeats=config.get("max_repeats", 10),
+		eval_sets=config.get("eval_sets"),
+		decontaminate_mode=config.get("decontaminate_mode", "drop"),
+		decontaminate_ngram=config.get("decontaminate_ngram", 8),
+		tmx_pairs=config.get("tmx_pairs"),
+		tmx_pivot=config.get("tmx_pivot"),
+		compression=config.get("compression"),
+		l1_column=config.get("l1_column"),
+		l2_column=config.get("l2_column"),
+		score_columns=config.get("score_columns"),
+		parallel_steps=config.get("parallel_steps", 1),
+		cache=config.get("step_cache", True)
 	)
 
 
+def run_single_corpus(config):
+	ensure_dir(os.path.dirname(config["output"]))
+	if config.get("incremental"):
+		if config.get("shards", 1) > 1:
+			print("[delta] Incremental runs are not sharded")
+		return run_incremental(single_corpus_kwargs(config))
+	if config.get("shards", 1) > 1:
+		return run_sharded(config)
+	return run_pipeline(**single_corpus_kwargs(config))
+
+
+def incremental_steps(steps):
+	"""(head, rest): input plus the per-row steps right after it, whose outputs can be appended to."""
+	if not steps or steps[0] != "input":
+		return [], steps
+	end = 1
+	while end < len(steps) and steps[end] in SHARDABLE_STEPS:
+		end += 1
+	return steps[:end], steps[end:]
+
+
+def run_incremental(kwargs):
+	"""
+	run_pipeline for an append-only plain_text corpus (see steps.delta). The
+	input step and the per-row steps right after it only process the lines
+	appended since the last run, and their outputs are appended to the
+	intermediates already on disk; the remaining steps run on the whole
+	corpus as usual. A rewritten prefix or changed settings mean a full run.
+	"""
+	head, rest = incremental_steps(kwargs["steps"])
+	sources = kwargs["input_path"]
+	if (not head or kwargs["format"] != "plain_text" or kwargs["start_from"]
+			or not isinstance(sources, list) or len(sources) != 2
+			or not all(delta.is_appendable(p) for p in sources)):
+		print("[delta] Incremental runs need the input step on two uncompressed plain_text files; running in full")
+		return run_pipeline(**kwargs)
+
+	output = kwargs["output_path"]
+	ext = fileio.compression_suffix(kwargs["compression"])
+	outputs = [output + STEP_SUFFIXES[step] + ext for step in head]
+	vectors = None
+	if kwargs["save_vectors"] and "embeddings" in head:
+		vectors = embeddings.vectors_path(output + ".embeddings.tsv")
+	params = step_cache.fingerprint(
+		sources=[os.path.abspath(p) for p in sources], steps=head, compression=kwargs["compression"],
+		params={step: step_params(step, kwargs) for step in head},
+		code={step: step_cache.code_version(STEP_CODE[step]) for step in head})
+
+	state = delta.load_state(output, params)
+	ranges = delta.scan(sources, state["sources"] if state else None)
+	if ranges is None:
+		state = None
+		ranges = delta.scan(sources)
+	done = state["sources"][0]["lines"] if state else 0
+	n_new = ranges[0]["lines"] - done
+	tail_paths = [f"{output}.delta.{k}" for k in range(len(sources))]
+
+	if state is None:
+		print(f"[delta] Processing all {n_new} pairs of {sources}")
+		inputs = sources
+		if any(r["end"] != os.path.getsize(r["path"]) for r in ranges):
+			# leave unmatched or unterminated trailing lines for the next run
+			inputs = [delta.extract_range(r["path"], 0, r["end"], p) for r, p in zip(ranges, tail_paths)]
+		run_pipeline(**{**kwargs, "steps": head, "input_path": inputs})
+	elif n_new:
+		print(f"[delta] Processing {n_new} pairs appended after the first {done}")
+		tail = [delta.extract_range(r["path"], r["start"], r["end"], p) for r, p in zip(ranges, tail_paths)]
+		run_pipeline(**{**kwargs, "steps": head, "input_path": tail,
+						"output_path": output + ".delta", "cache": False})
+		for k, step in enumerate(head):
+			delta.append_rows(output + ".delta" + STEP_SUFFIXES[step] + ext, outputs[k],
+							  shard_header_lines(head[1:k + 1]))
+		if vectors:
+			with open(vectors, "ab") as fout, open(embeddings.vectors_path(output + ".delta.embeddings.tsv"), "rb") as fin:
+				shutil.copyfileobj(fin, fout, fileio.WRITE_BUFFER)
+		print(f"[delta] Appended {n_new} pairs to {outputs}")
+	else:
+		print(f"[delta] No new pairs in {sources}")
+	for path in tail_paths + glob.glob(glob.escape(output + ".delta") + ".*"):
+		if os.path.exists(path):
+			os.remove(path)
+
+	delta.save_state(output, params,
+					 [{"path": r["path"], "offset": r["end"], "checksum": r["checksum"], "lines": r["lines"]}
+					  for r in ranges],
+					 outputs + ([vectors] if vectors else []))
+	current = outputs[-1]
+	if not rest:
+		return current
+	if not all(step in VECTOR_ALIGNED_STEPS for step in head[1:]):
+		vectors = None
+	return run_pipeline(**{**kwargs, "input_path": None, "steps": rest,
+						   "start_from": current, "vectors_path": vectors})
+
+
+def split_row_steps(steps):
+	"""(head, chain, tail): chain is the first contiguous run of SHARDABLE_STEPS."""
+	first = next((i for i, s in enumerate(steps) if s in SHARDABLE_STEPS), len(steps))
+	last = first
+	while last < len(steps) and steps[last] in SHARDABLE_STEPS:
+		last += 1
+	return steps[:first], steps[first:last], steps[last:]
+
+
+def shard_header_lines(chain):
+	"""Lines before the first data row in each shard's output of chain."""
+	header = 1
+	for step in chain:
+		if step == "normalise":
+			header += 1  # writes its own header, keeps every input line
+	return header
+
+
+def combine_shards(paths, out_path, header_lines):
+	"""Concatenate shard outputs in order, keeping the header lines of the first only."""
+	with fileio.TSVWriter(out_path, binary=True) as fout:
+		for k, path in enumerate(paths):
+			with fileio.open_file(path, "rb") as fin:
+				if k:
+					for _ in zip(range(header_lines), fin):
+						pass
+				for chunk in iter(lambda: fin.read(fileio.WRITE_BUFFER), b""):
+					fout.write(chunk)
+	return out_path
+
+
+def concat_files(paths, out_path):
+	with open(out_path, "wb") as fout:
+		for path in paths:
+			with open(path, "rb") as fin:
+				shutil.copyfileobj(fin, fout, fileio.WRITE_BUFFER)
+	return out_path
+
+
+def run_sharded(config):
+	"""
+	Single-corpus run with the per-row steps (embeddings, langid, filter,
+	normalise) split over config["shards"] processes: the TSV before them is
+	cut into balanced row ranges, each shard runs the steps on its range and
+	the outputs are concatenated in order before the remaining steps.
+	"""
+	manifest = plan_shards(config, config["shards"])
+	if manifest is None:
+		return run_pipeline(**single_corpus_kwargs(config))
+	n_shards = len(manifest["shards"])
+	print(f"[pipeline] Running {manifest['chain']} on {n_shards} shards of {manifest['source']}")
+	context = multiprocessing.get_context("spawn")
+	with ProcessPoolExecutor(max_workers=n_shards, mp_context=context, initializer=_init_worker,
+							 initargs=(config, config.get("shard_cpus", 1))) as pool:
+		futures = [pool.submit(_run_logged, f"shard{k:02d}", run_shard, manifest, k) for k in range(n_shards)]
+		for f in futures:
+			f.result()
+	return finalise_shards(manifest)
+
+
+# --- Shard manifest ------------------------------------------------------------
+# A sharded run is planned once (steps before the per-row block, shard row
+# ranges), every shard is then run independently -- by run_sharded's process
+# pool, or as one task of a SLURM job array via `pipeline.py run-shard` -- and
+# `finalise` combines the shard outputs and runs the remaining steps.
+
+def manifest_path_for(config):
+	return config["output"] + ".shards.json"
+
+
+def shard_done_path(shard):
+	return shard["run"]["output_path"] + ".done"
+
+
+def plan_shards(config, n_shards):
+	"""
+	Run the steps before the per-row block and describe its n_shards shards:
+	row range, byte range (uncompressed sources) and run_pipeline overrides
+	of each. Returns the manifest, or None if there is nothing to shard.
+	"""
+	kwargs = single_corpus_kwargs(config)
+	head, chain, tail = split_row_steps(kwargs["steps"])
+	if not chain:
+		return None
+	current = run_pipeline(**{**kwargs, "steps": head}) if head else kwargs["start_from"] or kwargs["input_path"]
+	if not isinstance(current, str):
+		raise ValueError(f"No TSV available before step '{chain[0]}'")
+	vectors = None
+	if not head and os.path.exists(embeddings.vectors_path(current)):
+		vectors = embeddings.vectors_path(current)
+
+	output = kwargs["output_path"]
+	ext = fileio.compression_suffix(kwargs["compression"])
+	shards = []
+	for k, (start, end, byte_range) in enumerate(fileio.shard_ranges(current, n_shards)):
+		name = f"{output}.shard{k:02d}"
+		shards.append({
+			"index": k,
+			"rows": [start, end],
+			"bytes": list(byte_range) if byte_range else None,
+			"run": {"steps": chain, "start_from": name + ".formatted.tsv" + ext, "output_path": name},
+		})
+	return {
+		"config": config,
+		"source": current,
+		"source_size": os.path.getsize(current),
+		"vectors": vectors,
+		"chain": chain,
+		"tail": tail,
+		"shards": shards,
+	}
+
+
+def run_shard(manifest, index):
+	"""Cut one shard out of the source TSV and run the per-row steps on it."""
+	shard = manifest["shards"][index]
+	run = shard["run"]
+	fileio.extract_rows(manifest["source"], run["start_from"], *shard["rows"], byte_range=shard["bytes"])
+	kwargs = {**single_corpus_kwargs(manifest["config"]), "input_path": None, **run}
+	result = run_pipeline(**kwargs)
+	with open(shard_done_path(shard), "w", encoding="utf-8") as f:
+		json.dump({"output": result}, f)
+	return result
+
+
+def finalise_shards(manifest):
+	"""Check that every shard completed, combine their outputs in order and run the remaining steps."""
+	if os.path.getsize(manifest["source"]) != manifest["source_size"]:
+		raise ValueError(f"{manifest['source']} changed since the shards were planned")
+	missing = [s["index"] for s in manifest["shards"] if not os.path.exists(shard_done_path(s))]
+	if missing:
+		raise RuntimeError(f"Shards not completed: {missing}")
+	outputs = []
+	for shard in manifest["shards"]:
+		with open(shard_done_path(shard), "r", encoding="utf-8") as f:
+			outputs.append(json.load(f)["output"])
+
+	config = manifest["config"]
+	kwargs = single_corpus_kwargs(config)
+	chain = manifest["chain"]
+	output = kwargs["output_path"]
+	combined = output + STEP_SUFFIXES[chain[-1]] + fileio.compression_suffix(kwargs["compression"])
+	combine_shards(outputs, combined, shard_header_lines(chain))
+
+	vectors = manifest["vectors"]
+	if not all(s in VECTOR_ALIGNED_STEPS for s in chain):
+		vectors = None
+	elif kwargs["save_vectors"] and "embeddings" in chain:
+		vectors = concat_files(
+			[embeddings.vectors_path(s["run"]["output_path"] + ".embeddings.tsv") for s in manifest["shards"]],
+			embeddings.vectors_path(output + ".embeddings.tsv"))
+	print(f"[pipeline] Combined {len(outputs)} shards into {combined}")
+
+	result = combined
+	if manifest["tail"]:
+		result = run_pipeline(**{**kwargs, "input_path": None, "steps": manifest["tail"],
+								 "start_from": combined, "vectors_path": vectors})
+	# only now: if the tail fails, finalise can be run again from the shards
+	for shard in manifest["shards"]:
+		for path in glob.glob(glob.escape(shard["run"]["output_path"]) + ".*"):
+			os.remove(path)
+	return result
+
+
+SLURM_TEMPLATE = """#!/bin/bash
+#SBATCH --job-name={job_name}
+#SBATCH --array=0-{last}
+#SBATCH --cpus-per-task={cpus}
+#SBATCH --output={output}.slurm-%A_%a.log
+{options}
+# One task per shard. Locally: bash {script} <index>
+# When all tasks succeeded: {python} {pipeline} finalise --manifest {manifest}
+set -euo pipefail
+INDEX=${{SLURM_ARRAY_TASK_ID:-$1}}
+cd {workdir}
+{python} {pipeline} run-shard --manifest {manifest} --index "$INDEX"
+"""
+
+
+def write_plan(config, n_shards, manifest_path=None):
+	"""`pipeline.py plan`: write the shard manifest and a SLURM array-job script."""
+	manifest_path = manifest_path or manifest_path_for(config)
+	manifest = plan_shards(config, n_shards)
+	if manifest is None:
+		raise ValueError("No per-row steps (embeddings, langid, filter, normalise) to shard")
+	with open(manifest_path, "w", encoding="utf-8") as f:
+		json.dump(manifest, f, indent=2)
+
+	script = os.path.splitext(manifest_path)[0] + ".sbatch"
+	with open(script, "w", encoding="utf-8") as f:
+		f.write(SLURM_TEMPLATE.format(
+			job_name=os.path.basename(config["output"]),
+			last=n_shards - 1,
+			cpus=config.get("shard_cpus", 1),
+			output=os.path.abspath(config["output"]),
+			options="\n".join(f"#SBATCH {opt}" for opt in config.get("slurm_options", [])),
+			script=os.path.abspath(script),
+			python=sys.executable,
+			pipeline=os.path.abspath(__file__),
+			manifest=os.path.abspath(manifest_path),
+			workdir=os.getcwd(),
+		))
+	print(f"[pipeline] Planned {n_shards} shards in {manifest_path}")
+	print(f"[pipeline] Submit with: sbatch {script}")
+	return manifest_path
+
+
 def run_multi_corpus(config):
 	out_dir = config["output"]
 	ensure_dir(out_dir)
 
 	merged_steps = [s for s in config.get("steps", []) if s in MERGED_STEPS]
+	ext = fileio.compression_suffix(config.get("compression"))
 	intermediate_paths = []
+	vector_paths = []
+	run_paths = []
 
-	for inp in config["inputs"]:
-		result_path = run_single_input(inp, config, out_dir)
-		if result_path:
+	two_level = config.get("two_level_dedup", False) and "dedup" in merged_steps
+	if two_level:
+		two_level_filter(merged_steps, config)  # validate before any corpus runs
+	if "decontaminate" in merged_steps and not config.get("eval_sets"):
+		raise ValueError("decontaminate needs eval_sets: the evaluation files to check the pairs against")
+
+	for result in run_corpora(config, out_dir, two_level):
+		if result:
+			result_path, vector_path, run_path = result
 			intermediate_paths.append(result_path)
+			vector_paths.append(vector_path)
+			if two_level:
+				run_paths.append(run_path)
 
 	if not merged_steps:
 		return intermediate_paths
 
-	merged_path = merge_inputs(intermediate_paths, out_dir)
-	return run_pipeline(
+	if two_level:
+		# filter (if any) and dedup already happened in the runs
+		merged_path = deduplicate.merge_runs(
+			run_paths, os.path.join(out_dir, "merged.deduped.tsv" + ext),
+			index_path=config.get("dedup_index"),
+			update_index=config.get("dedup_index_update", False),
+			index_version=config.get("dedup_index_version"))
+		merged_steps = merged_steps[merged_steps.index("dedup") + 1:]
+		if not merged_steps:
+			return merged_path
+	else:
+		if "semantic_dedup" not in merged_steps:
+			vector_paths = None
+		merged_path = merge_inputs(intermediate_paths, out_dir, vector_paths, ext,
+								   materialise=config.get("materialise_merged", False))
+	return run_pipeline(**dict(
+		merged_stage_kwargs(config, merged_path, out_dir),
+		steps=merged_steps,
+		start_from=merged_path if two_level else None,
+		vectors_path=os.path.join(out_dir, "merged.vec") if vector_paths and not two_level else None))
+
+
+def merged_stage_kwargs(config, merged_path, out_dir):
+	"""run_pipeline arguments of the merged stage of a multi-corpus config."""
+	return dict(
 		input_path=merged_path,
 		output_path=os.path.join(out_dir, "merged"),
-		steps=merged_steps,
+		steps=[s for s in config.get("steps", []) if s in MERGED_STEPS],
 		l1=config.get("l1"),
 		l2=config.get("l2"),
 		format="tsv",
@@ -96,24 +512,182 @@ def run_multi_corpus(config):
 		langid_l2=config.get("langid_l2_prob"),
 		model=config.get("model", "labse"),
 		model_path=config.get("model_path"),
-		bifixer_flags=config.get("bifixer_flags", None)
+		bifixer_flags=config.get("bifixer_flags", None),
+		semantic_threshold=config.get("semantic_threshold", 0.95),
+		dedup_index=config.get("dedup_index"),
+		dedup_index_update=config.get("dedup_index_update", False),
+		dedup_index_version=config.get("dedup_index_version"),
+		dedup_preserve_order=config.get("dedup_preserve_order", False),
+		max_repeats=config.get("max_repeats", 10),
+		eval_sets=config.get("eval_sets"),
+		decontaminate_mode=config.get("decontaminate_mode", "drop"),
+		decontaminate_ngram=config.get("decontaminate_ngram", 8),
+		compression=config.get("compression"),
+		cache=config.get("step_cache", True)
 	)
 
 
+def run_corpus(inp, config, out_dir, two_level=False):
+	"""
+	Per-corpus part of multi-corpus mode (steps, then the fingerprint run in
+	two-level dedup mode). Returns (result_path, vectors_path, run_path) or None.
+	"""
+	result_path = run_single_input(inp, config, out_dir)
+	if not result_path:
+		return None
+	run_path = None
+	if two_level:
+		merged_steps = [s for s in config.get("steps", []) if s in MERGED_STEPS]
+		row_filter, filter_params = two_level_filter(merged_steps, config)
+		run_path = deduplicate.build_run(
+			result_path, deduplicate.run_path(result_path), row_filter, filter_params)
+	return result_path, corpus_vectors_path(inp, out_dir), run_path
+
+
+def corpus_size(inp):
+	"""Bytes of input behind one corpus, used to schedule large corpora first."""
+	if inp.get("start_from"):
+		paths = [inp["start_from"]]
+	else:
+		paths = inp.get("paths") or []
+		paths = [paths] if isinstance(paths, str) else paths
+	size = 0
+	for path in paths:
+		for match in glob.glob(path.split(input_formats.ZIP_SEP)[0]):
+			size += os.path.getsize(match)
+	return size
+
+
+def corpus_workers(config):
+	"""
+	Number of corpora run at once: parallel_corpora, capped so that
+	corpus_cpus cores and corpus_memory_gb per corpus fit within
+	cpu_budget (default: all cores) and memory_budget_gb.
+	"""
+	workers = config.get("parallel_corpora", 1)
+	corpus_cpus = config.get("corpus_cpus", 1)
+	workers = min(workers, max(1, config.get("cpu_budget", os.cpu_count() or 1) // corpus_cpus))
+	if config.get("memory_budget_gb") and config.get("corpus_memory_gb"):
+		workers = min(workers, max(1, int(config["memory_budget_gb"] // config["corpus_memory_gb"])))
+	return max(1, min(workers, len(config["inputs"])))
+
+
+class PrefixedStream:
+	"""Line-buffered stdout wrapper that tags every line with a corpus name."""
+
+	def __init__(self, stream, name):
+		self.stream = stream
+		self.prefix = f"[{name}] "
+		self.pending = ""
+
+	def write(self, text):
+		lines = (self.pending + text).split("\n")
+		self.pending = lines.pop()
+		for line in lines:
+			self.stream.write(self.prefix + line + "\n")
+		self.stream.flush()
+		return len(text)
+
+	def flush(self):
+		if self.pending:
+			self.stream.write(self.prefix + self.pending)
+			self.pending = ""
+		self.stream.flush()
+
+
+def _init_worker(config, threads=1):
+	configure(config)
+	threads = str(threads)
+	for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+		os.environ[var] = threads
+	if "torch" in sys.modules:
+		sys.modules["torch"].set_num_threads(int(threads))
+
+
+def _run_logged(name, fn, *args, **kwargs):
+	"""Call fn in a worker with every log line prefixed by name."""
+	stream = PrefixedStream(sys.stdout, name)
+	with contextlib.redirect_stdout(stream):
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			stream.flush()
+
+
+def run_corpora(config, out_dir, two_level=False):
+	"""
+	Run the per-corpus chains, several at once when corpus_workers(config) > 1.
+	Corpora are submitted largest first; results come back in config order.
+	"""
+	inputs = config["inputs"]
+	workers = corpus_workers(config)
+	if workers == 1:
+		return [run_corpus(inp, config, out_dir, two_level) for inp in inputs]
+
+	order = sorted(range(len(inputs)), key=lambda i: corpus_size(inputs[i]), reverse=True)
+	print(f"[pipeline] Running {len(inputs)} corpora with {workers} workers")
+	# spawn: the workers load their own models and thread settings
+	context = multiprocessing.get_context("spawn")
+	with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+							 initializer=_init_worker, initargs=(config, config.get("corpus_cpus", 1))) as pool:
+		futures = {i: pool.submit(_run_logged, inputs[i]["name"], run_corpus, inputs[i], config, out_dir, two_level)
+				   for i in order}
+		return [futures[i].result() for i in range(len(inputs))]
+
+
+def two_level_filter(merged_steps, config):
+	"""
+	In two-level dedup mode, dedup runs on per-corpus fingerprint runs, so only
+	row-wise filtering may precede it. Returns (row_filter, filter_params).
+	"""
+	before = merged_steps[:merged_steps.index("dedup")]
+	if any(s != "filter" for s in before):
+		raise ValueError(f"two_level_dedup only supports 'filter' before 'dedup', got {before}")
+	if config.get("dedup_preserve_order"):
+		raise ValueError("two_level_dedup cannot be combined with dedup_preserve_order")
+	if "filter" not in before:
+		return None, None
+	thresholds = [config.get("alignment_score"), config.get("langid_l1_prob"), config.get("langid_l2_prob")]
+	# the filter step's own row function, so the runs hold exactly the rows it keeps
+	return (lambda line, line_number: filtering.filter_line(line, *thresholds, line_number)), thresholds
+
+
+def corpus_vectors_path(inp, out_dir):
+	"""
+	Where the pair vectors of one corpus live: next to its semantic_dedup
+	TSV if that step ran per corpus (it keeps the vectors of its kept rows),
+	otherwise next to its embeddings TSV.
+	"""
+	steps = [s for s in inp.get("steps", []) if s in PER_CORPUS_STEPS]
+	base = os.path.join(out_dir, inp["name"])
+	if "semantic_dedup" in steps:
+		return embeddings.vectors_path(base + ".semdedup.tsv")
+	if inp.get("start_from") and "embeddings" not in steps:
+		return embeddings.vectors_path(inp["start_from"])
+	return embeddings.vectors_path(base + ".embeddings.tsv")
+
+
 def run_single_input(inp, config, out_dir):
 	"""Run per-corpus steps for a single input definition."""
 	name = inp["name"]
-	base_out = os.path.join(out_dir, name)
 	steps_to_run = [s for s in inp.get("steps", []) if s in PER_CORPUS_STEPS]
 
 	if inp.get("start_from") and not steps_to_run:
 		return inp["start_from"]
 
 	print(f"[pipeline] Processing corpus: {name}")
-	return run_pipeline(
+	kwargs = single_input_kwargs(inp, config, out_dir)
+	if inp.get("incremental", config.get("incremental")):
+		return run_incremental(kwargs)
+	return run_pipeline(**kwargs)
+
+
+def single_input_kwargs(inp, config, out_dir):
+	"""run_pipeline arguments of the per-corpus steps of one multi-corpus input."""
+	return dict(
 		input_path=None if inp.get("start_from") else inp.get("paths"),
-		output_path=base_out,
-		steps=steps_to_run,
+		output_path=os.path.join(out_dir, inp["name"]),
+		steps=[s for s in inp.get("steps", []) if s in PER_CORPUS_STEPS],
 		l1=inp.get("l1", config.get("l1")),
 		l2=inp.get("l2", config.get("l2")),
 		format=inp.get("type", config.get("format", "plain_text")),
@@ -123,98 +697,396 @@ def run_single_input(inp, config, out_dir):
 		model=config.get("model", "labse"),
 		model_path=config.get("model_path"),
 		start_from=inp.get("start_from"),
-		bifixer_flags=config.get("bifixer_flags", None)
+		bifixer_flags=config.get("bifixer_flags", None),
+		save_vectors="semantic_dedup" in config.get("steps", []) + inp.get("steps", []),
+		semantic_threshold=config.get("semantic_threshold", 0.95),
+		tmx_pairs=inp.get("tmx_pairs"),
+		tmx_pivot=inp.get("tmx_pivot"),
+		compression=config.get("compression"),
+		l1_column=inp.get("l1_column", config.get("l1_column")),
+		l2_column=inp.get("l2_column", config.get("l2_column")),
+		score_columns=inp.get("score_columns", config.get("score_columns")),
+		parallel_steps=config.get("parallel_steps", 1),
+		cache=config.get("step_cache", True)
 	)
 
 
-def merge_inputs(intermediate_paths, out_dir):
-	"""Concatenate TSV files into one merged file (with header)."""
-	merged_path = os.path.join(out_dir, "merged.langid.tsv")
-	with open(merged_path, "w", encoding="utf8") as fout:
-		header_written = False
-		for path in intermediate_paths:
-			with open(path, "r", encoding="utf8") as fin:
-				header = next(fin)
-				if not header_written:
-					fout.write(header)
-					header_written = True
-				fout.writelines(fin)
-	print(f"[pipeline] Merged TSV written to {merged_path}")
+def merge_inputs(intermediate_paths, out_dir, vector_paths=None, ext="", materialise=False):
+	"""
+	Present the per-corpus TSVs to the merged stage as one file with a single
+	header: a merged.langid.manifest read as their concatenation, or, with
+	materialise, a physical merged.langid.tsv copy.
+	If vector_paths is given, the per-corpus pair vectors are concatenated
+	into merged.vec in the same order.
+	"""
+	if materialise:
+		merged_path = os.path.join(out_dir, "merged.langid.tsv" + ext)
+		with fileio.TSVWriter(merged_path, binary=True) as fout:
+			# raw bytes: the lines are copied, never decoded
+			with fileio.open_file(fileio.write_manifest(intermediate_paths, merged_path + ".tmp.manifest"), "rb") as fin:
+				for chunk in iter(lambda: fin.read(fileio.WRITE_BUFFER), b""):
+					fout.write(chunk)
+		os.remove(merged_path + ".tmp.manifest")
+		print(f"[pipeline] Merged TSV written to {merged_path}")
+	else:
+		merged_path = fileio.write_manifest(
+			intermediate_paths, os.path.join(out_dir, "merged.langid" + fileio.MANIFEST_SUFFIX))
+		print(f"[pipeline] Merged {len(intermediate_paths)} corpora into {merged_path} without copying")
+
+	if vector_paths:
+		missing = [p for p in vector_paths if not os.path.exists(p)]
+		if missing:
+			raise FileNotFoundError(f"Pair vectors missing for semantic_dedup: {missing}")
+		with open(os.path.join(out_dir, "merged.vec"), "wb") as fout:
+			for path in vector_paths:
+				with open(path, "rb") as fin:
+					shutil.copyfileobj(fin, fout, 1 << 24)
 	return merged_path
 
 
 def run_pipeline(input_path, output_path, steps, l1, l2, format,
 				 filter_config=None, model="labse", model_path=None,
 				 alignment=None, langid_l1=None, langid_l2=None,
-				 start_from=None, bifixer_flags=None):
+				 start_from=None, bifixer_flags=None, save_vectors=False,
+				 vectors_path=None, semantic_threshold=0.95, dedup_index=None,
+				 dedup_index_update=False, dedup_index_version=None,
+				 dedup_preserve_order=False, max_repeats=10, eval_sets=None,
+				 decontaminate_mode="drop", decontaminate_ngram=8, tmx_pairs=None,
+				 tmx_pivot=None, compression=None, l1_column=None, l2_column=None,
+				 score_columns=None, parallel_steps=1, cache=True):
 	"""
 	Run the full pipeline or selected steps.
 	bifixer_flags: optional list of strings with flags for Bifixer step
+	save_vectors: write pair vectors next to the embeddings TSV
+	vectors_path: pair vectors aligned with the rows of the input / start_from TSV
+	dedup_index: optional persistent hash index of previously shipped pairs
+	max_repeats: cap_repeats limit on pairs sharing one source or target sentence
+	eval_sets: evaluation files the decontaminate step checks against
+	tmx_pairs / tmx_pivot: extra language pairs written by the input step for tmx
+	compression: compression of the step outputs ("gz", "zst", "xz" or None)
+	l1_column / l2_column / score_columns: record fields read by parquet / jsonl input
+	parallel_steps: how many independent column steps may run at once (see plan_stages)
+	cache: skip steps whose recorded fingerprint in <output_path>.run.json still matches
 	"""
+	# every argument, for the fingerprints and for run_branches to rerun single steps
+	options = dict(
+		input_path=input_path, output_path=output_path, steps=steps, l1=l1, l2=l2, format=format,
+		filter_config=filter_config, model=model, model_path=model_path,
+		alignment=alignment, langid_l1=langid_l1, langid_l2=langid_l2,
+		start_from=start_from, bifixer_flags=bifixer_flags, save_vectors=save_vectors,
+		vectors_path=vectors_path, semantic_threshold=semantic_threshold, dedup_index=dedup_index,
+		dedup_index_update=dedup_index_update, dedup_index_version=dedup_index_version,
+		dedup_preserve_order=dedup_preserve_order, max_repeats=max_repeats, eval_sets=eval_sets,
+		decontaminate_mode=decontaminate_mode, decontaminate_ngram=decontaminate_ngram, tmx_pairs=tmx_pairs,
+		tmx_pivot=tmx_pivot, compression=compression, l1_column=l1_column, l2_column=l2_column,
+		score_columns=score_columns, parallel_steps=parallel_steps, cache=cache)
+	if "decontaminate" in steps and not eval_sets:
+		raise ValueError("decontaminate needs eval_sets: the evaluation files to check the pairs against")
 	current = start_from
+	ext = fileio.compression_suffix(compression)
+	vectors = vectors_path
+	if vectors is None and start_from and os.path.exists(embeddings.vectors_path(start_from)):
+		vectors = embeddings.vectors_path(start_from)
 	step_fns = {
 		"input": lambda p: input_formats.run(
 			input_files=input_path, l1=l1, l2=l2, input_format=format,
-			output=p + ".formatted.tsv"),
+			output=p + ".formatted.tsv" + ext, tmx_pairs=tmx_pairs, tmx_pivot=tmx_pivot,
+			l1_column=l1_column, l2_column=l2_column, score_columns=score_columns),
 		"embeddings": lambda p: embeddings.add_embeddings(
-			current, p + ".embeddings.tsv",
+			current, p + ".embeddings.tsv" + ext,
 			model=embeddings.load_embedding_model(model, model_path),
-			l1=l1, l2=l2),
-		"langid": lambda p: langid.score(current, p + ".langid.tsv", l1, l2),
+			l1=l1, l2=l2,
+			vectors_path=embeddings.vectors_path(p + ".embeddings.tsv") if save_vectors else None,
+			model_id=embeddings.model_identity(model, model_path)),
+		"langid": lambda p: langid.score(current, p + ".langid.tsv" + ext, l1, l2),
 		"filter": lambda p: filtering.apply_filters(
-			current, p + ".filtered.tsv", alignment, langid_l1, langid_l2),
-		"dedup": lambda p: deduplicate.deduplicate_tsv(current, p + ".deduped.tsv"),
+			current, p + ".filtered.tsv" + ext, alignment, langid_l1, langid_l2),
+		"dedup": lambda p: deduplicate.deduplicate_tsv(
+			current, p + ".deduped.tsv" + ext, index_path=dedup_index,
+			update_index=dedup_index_update, index_version=dedup_index_version,
+			preserve_order=dedup_preserve_order),
+		"semantic_dedup": lambda p: semantic_dedup.semantic_dedup(
+			current, vectors, p + ".semdedup.tsv" + ext, threshold=semantic_threshold,
+			dim=embeddings.EMBEDDING_DIMS[model],
+			kept_vectors_path=embeddings.vectors_path(p + ".semdedup.tsv") if save_vectors else None),
+		"cap_repeats": lambda p: cap_repeats.cap_repeats(
+			current, p + ".capped.tsv" + ext, max_repeats=max_repeats),
+		"decontaminate": lambda p: decontaminate.decontaminate(
+			current, p + ".decontaminated.tsv" + ext, eval_sets,
+			mode=decontaminate_mode, ngram=decontaminate_ngram),
 		"normalise": lambda p: normalisation.apply_normalisation(
-			current, p + ".normalised.tsv", l1, l2),
+			current, p + ".normalised.tsv" + ext, l1, l2),
 	}
 	
 	# Only add bifixer step if installed
 	if bifixer.is_available():
 		step_fns["bifixer"] = lambda p: bifixer.run(
-			current, p + ".bifixer.tsv", l1, l2, flags=bifixer_flags
+			current, p + ".bifixer.tsv" + ext, l1, l2, flags=bifixer_flags
 		)
 	else:
 		print("[pipeline] Bifixer not available, step omitted.")
 
-	for step in steps:
-		if current is None and step == "input":
-			current = input_path
-		if current is None and step == "filter":
+	manifest = step_cache.RunManifest(output_path) if cache else None
+	input_fp = None
+	for stage in plan_stages(steps, parallel_steps):
+		step = stage[0]
+		if current is None:
+			# the first step reads the input (e.g. the merged corpora in multi-corpus mode)
 			current = input_path
 		if current is None:
 			raise ValueError(f"No TSV available before step '{step}'")
+		if "semantic_dedup" in stage and vectors is None:
+			raise ValueError("semantic_dedup needs pair vectors: run embeddings first, "
+							 "before any step that drops rows")
+
+		key = "+".join(stage)
+		fp = entry = None
+		if manifest is not None and is_cacheable(stage, options):
+			if input_fp is None:
+				input_fp = step_cache.path_fingerprint(current)
+			fp = stage_fingerprint(stage, input_fp, options, vectors)
+			entry = manifest.lookup(key, fp)
+
+		if entry:
+			print(f"[pipeline] Reusing cached output of {key}: {entry['output']}")
+			current = entry["output"]
+		elif len(stage) > 1:
+			current = run_branches(stage, current, output_path, options)
+		else:
+			if step not in step_fns:
+				print(f"[pipeline] Step '{step}' not available, skipping.")
 
-		if step not in step_fns:
-			print(f"[pipeline] Step '{step}' not available, skipping.")
-
-		print(f"[pipeline] Running step: {step}")
-		out_path = output_path 
-		step_fns[step](out_path)
-		suffix = {
-			"input": ".formatted.tsv",
-			"embeddings": ".embeddings.tsv",
-			"langid": ".langid.tsv",
-			"filter": ".filtered.tsv",
-			"dedup": ".deduped.tsv",
-			"normalise": ".normalised.tsv",
-			"bifixer": ".bifixer.tsv"
-		}.get(step)
-		if suffix:
-			current = out_path + suffix
+			print(f"[pipeline] Running step: {step}")
+			out_path = output_path 
+			step_fns[step](out_path)
+			suffix = STEP_SUFFIXES.get(step)
+			if suffix:
+				current = out_path + suffix + ext
+		if "embeddings" in stage and save_vectors:
+			vectors = embeddings.vectors_path(output_path + ".embeddings.tsv")
+		elif step == "semantic_dedup" and save_vectors:
+			vectors = embeddings.vectors_path(output_path + ".semdedup.tsv")
+		elif not all(s in VECTOR_ALIGNED_STEPS for s in stage):
+			vectors = None
+
+		if fp is None:
+			input_fp = None
+			continue
+		if not entry:
+			written = "embeddings" in stage or step == "semantic_dedup"
+			entry = manifest.record(key, fp, current, [vectors] if written and vectors else [])
+		input_fp = entry["outputs"][current]
 
 	return current
 
 
+def is_cacheable(stage, options):
+	"""Steps with side effects beyond their output file always run."""
+	if "dedup" in stage and options["dedup_index_update"]:
+		return False
+	if "input" in stage and (options["tmx_pairs"] or options["tmx_pivot"]):
+		return False
+	return True
+
+
+def stage_fingerprint(stage, input_fp, options, vectors):
+	"""Fingerprint of everything a stage's output depends on."""
+	files = {}
+	if "dedup" in stage and options["dedup_index"]:
+		files["dedup_index"] = step_cache.path_fingerprint(options["dedup_index"])
+	if "decontaminate" in stage:
+		files["eval_sets"] = step_cache.path_fingerprint(options["eval_sets"] or [])
+	if "semantic_dedup" in stage:
+		files["vectors"] = step_cache.path_fingerprint(vectors)
+	code = [step_cache.code_version(STEP_CODE[s]) for s in stage if s in STEP_CODE]
+	if len(stage) > 1:
+		code.append(step_cache.code_version(join_columns))
+	return step_cache.fingerprint(
+		steps=stage, input=input_fp, files=files, code=code,
+		compression=options["compression"],
+		params={s: step_params(s, options) for s in stage})
+
+
+def step_params(step, options):
+	"""
+	The settings a step's output depends on: its STEP_PARAMS plus the identity
+	of the models (embeddings, langid) or language modules (normalise) it loads.
+	"""
+	params = {name: options[name] for name in STEP_PARAMS.get(step, [])}
+	if step == "embeddings":
+		params.update(embeddings.model_identity(options["model"], options["model_path"]))
+	elif step == "langid":
+		params.update(langid.model_identity())
+	elif step == "normalise":
+		params["normalisers"] = [step_cache.code_version(normalisation.normaliser_module(options[lang]))
+								 for lang in ("l1", "l2")]
+	return params
+
+
+def plan_stages(steps, parallel_steps=1):
+	"""
+	Group the steps into stages run one after the other. Consecutive column
+	steps (STEP_COLUMNS) share a stage, up to parallel_steps of them, as long
+	as none needs a column another one adds; every other step is a stage of
+	its own, since it depends on all rows of the previous output.
+	"""
+	stages = []
+	for step in steps:
+		group = stages[-1] if stages else None
+		if (parallel_steps > 1 and step in STEP_COLUMNS and group
+				and all(s in STEP_COLUMNS for s in group) and len(group) < parallel_steps
+				and not any(set(STEP_COLUMNS[step]["needs"]) & set(STEP_COLUMNS[s]["adds"]) for s in group)):
+			group.append(step)
+		else:
+			stages.append([step])
+	return stages
+
+
+def _run_step(options, step, start_from, output_path):
+	return run_pipeline(**{**options, "input_path": None, "steps": [step], "start_from": start_from,
+						   "output_path": output_path, "vectors_path": None, "parallel_steps": 1,
+						   "cache": False})
+
+
+def _split_row(line):
+	return None if line is None else line.rstrip(b"\r\n").split(b"\t")
+
+
+def join_columns(input_path, paths, n_added, out_path):
+	"""
+	Join the outputs of column steps run on input_path: each input row,
+	followed by the last n_added[k] columns of the row of path k for it.
+	A step skips the rows it cannot read (a malformed line), so rows are
+	matched to the input in order by their leading fields, not by position,
+	and only the rows every step kept are written, as in a sequential run.
+	Returns the number of data rows of the last output and the positions of
+	those left out.
+	"""
+	dropped = []
+	position = -1  # of the pending row of the last output, the header being -1
+	with contextlib.ExitStack() as stack, fileio.TSVWriter(out_path, binary=True) as fout:
+		source = stack.enter_context(fileio.open_file(input_path, "rb"))
+		files = [stack.enter_context(fileio.open_file(p, "rb")) for p in paths]
+		pending = [_split_row(next(f, None)) for f in files]
+		for line in source:
+			fields = _split_row(line)
+			kept = [p is not None and p[:len(p) - n] == fields for p, n in zip(pending, n_added)]
+			if all(kept):
+				for p, n in zip(pending, n_added):
+					fields = fields + p[len(p) - n:]
+				fout.write(b"\t".join(fields) + b"\n")
+			elif kept[-1]:
+				dropped.append(position)
+			position += kept[-1]
+			for k, file in enumerate(files):
+				if kept[k]:
+					pending[k] = _split_row(next(file, None))
+		for path, p in zip(paths, pending):
+			if p is not None:
+				raise ValueError(f"{path} has rows that do not match the rows of {input_path}")
+	return position, dropped
+
+
+def run_branches(stage, current, output_path, options):
+	"""
+	Run the column steps of one stage concurrently on current, each in its own
+	process, and join their columns into the output the last step would have
+	written in a sequential run. Earlier steps keep their usual outputs.
+	"""
+	last = stage[-1]
+	prefixes = [output_path + ".branch" if step == last else output_path for step in stage]
+	threads = max(1, (os.cpu_count() or 1) // len(stage))
+	io_config = {"row_index_stride": fileio.INDEX_STRIDE, "write_buffer_size": fileio.WRITE_BUFFER,
+				 "checkpoint_interval": checkpoint.INTERVAL}
+	print(f"[pipeline] Running steps {stage} concurrently")
+	context = multiprocessing.get_context("spawn")
+	with ProcessPoolExecutor(max_workers=len(stage), mp_context=context,
+							 initializer=_init_worker, initargs=(io_config, threads)) as pool:
+		futures = [pool.submit(_run_logged, step, _run_step, options, step, current, prefix)
+				   for step, prefix in zip(stage, prefixes)]
+		outputs = [f.result() for f in futures]
+
+	joined = output_path + STEP_SUFFIXES[last] + fileio.compression_suffix(options["compression"])
+	last_rows, dropped = join_columns(current, outputs, [len(STEP_COLUMNS[s]["adds"]) for s in stage], joined)
+	if last == "embeddings" and options["save_vectors"]:
+		vectors = embeddings.vectors_path(output_path + ".embeddings.tsv")
+		os.replace(embeddings.vectors_path(outputs[-1]), vectors)
+		if dropped:
+			embeddings.drop_vector_rows(vectors, last_rows, dropped)
+	for path in glob.glob(glob.escape(output_path + ".branch") + ".*"):
+		os.remove(path)
+	print(f"[pipeline] Joined {stage} into {joined}")
+	return joined
+
+
+def configure(config):
+	"""Apply process-wide settings from the config (also run in worker processes)."""
+	fileio.INDEX_STRIDE = config.get("row_index_stride", fileio.INDEX_STRIDE)
+	fileio.WRITE_BUFFER = config.get("write_buffer_size", fileio.WRITE_BUFFER)
+	step_cache.FULL_HASH = config.get("cache_full_hash", step_cache.FULL_HASH)
+	checkpoint.INTERVAL = config.get("checkpoint_interval", checkpoint.INTERVAL)
+
+
 def main():
 	parser = argparse.ArgumentParser(description="Run the data cleaning pipeline.")
-	parser.add_argument("--config", type=str, required=True,
+	parser.add_argument("command", nargs="?", default="run",
+						choices=["run", "plan", "run-shard", "finalise", "serve"],
+						help="run (default); plan / run-shard / finalise for sharded HPC runs; "
+							 "serve to clean pairs over HTTP with the models kept loaded")
+	parser.add_argument("--config", type=str,
 						help="Path to YAML config file")
+	parser.add_argument("--shards", type=int,
+						help="plan: number of shards (default: shards from the config)")
+	parser.add_argument("--index", type=int,
+						help="run-shard: index of the shard to process")
+	parser.add_argument("--manifest", type=str,
+						help="Shard manifest (default: <output>.shards.json)")
+	parser.add_argument("--sample", type=int, metavar="N",
+						help="run: clean N randomly sampled pairs instead of the corpus and report "
+							 "per-step yield, score distributions, throughput and projected time and disk")
+	parser.add_argument("--seed", type=int, default=0,
+						help="--sample: random seed")
 	args = parser.parse_args()
 
-	with open(args.config, "r", encoding="utf-8") as f:
-		config = yaml.safe_load(f)
+	config = None
+	if args.config:
+		with open(args.config, "r", encoding="utf-8") as f:
+			config = yaml.safe_load(f)
+	elif args.command in ("run", "plan", "serve") or not args.manifest:
+		parser.error("--config is required")
+
+	if args.command in ("run-shard", "finalise"):
+		with open(args.manifest or manifest_path_for(config), "r", encoding="utf-8") as f:
+			manifest = json.load(f)
+		configure(manifest["config"])
+		if args.command == "run-shard":
+			if args.index is None:
+				parser.error("run-shard needs --index")
+			run_shard(manifest, args.index)
+		else:
+			finalise_shards(manifest)
+		return
+
+	if args.command == "serve":
+		from server import serve
+		serve(config)
+		return
 
+	configure(config)
 	resolver = LangResolver(GLOTLID_INV, ALIASES)
+	if args.sample:
+		if args.command != "run":
+			parser.error("--sample only applies to run")
+		from sample import run_sample
+		run_sample(resolve_languages(config, resolver), args.sample, args.seed)
+		return
+	if args.command == "plan":
+		if config.get("inputs"):
+			parser.error("plan supports single-corpus configs")
+		resolve_languages(config, resolver)
+		ensure_dir(os.path.dirname(config["output"]))
+		write_plan(config, args.shards or config.get("shards", 1), args.manifest)
+		return
 	run_pipeline_from_config(config, resolver=resolver)
 
 
@@ -0,0 +1,344 @@
+# sample.py
+import os
+import glob
+import json
+import math
+import time
+import random
+import numpy as np
+from pipeline import (single_corpus_kwargs, single_input_kwargs, merged_stage_kwargs, merge_inputs, run_pipeline,
+					  shard_header_lines, ensure_dir, MERGED_STEPS, VECTOR_ALIGNED_STEPS, STEP_COLUMNS, STEP_SUFFIXES)
+from steps import input_formats, embeddings, bifixer, fileio
+
+# `pipeline.py --config X --sample N`: a trial run on N pairs drawn uniformly
+# from all the configured inputs (reservoir sampling, one pass over the
+# corpus). The sample goes through the configured steps one at a time, and
+# the report gives per step the rows kept, the distribution of the scores it
+# adds, its throughput, and the time and disk a full run would take.
+#
+# Projections are linear in the number of rows: each step's start-up (model
+# loading, index building) is timed on an empty input and counted once, the
+# rest is scaled by corpus size / sample size. Duplicates are much rarer in a
+# sample than in the corpus, so dedup, semantic_dedup and cap_repeats remove
+# less from a sample than they will from the full run.
+
+QUANTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+# score columns checked by filter, and the config keys of their thresholds
+FILTER_THRESHOLDS = {"cosine_similarity": "alignment_score", "l1_prob": "langid_l1_prob", "l2_prob": "langid_l2_prob"}
+# steps with a fixed start-up cost worth separating from the per-row time
+STARTUP_STEPS = {"embeddings", "langid", "dedup", "decontaminate", "bifixer"}
+# steps whose yield depends on pairs meeting each other
+CORPUS_STEPS = {"dedup", "semantic_dedup", "cap_repeats"}
+
+
+class Reservoir:
+	"""
+	Uniform sample of n items from a stream of unknown length, with Li's
+	Algorithm L: after the first n items, random numbers are only drawn for
+	the O(n log(N/n)) items that enter the sample.
+	"""
+
+	def __init__(self, n, rng):
+		self.n = n
+		self.rng = rng
+		self.items = []
+		self.seen = 0
+		self.w = 1.0
+		self.next = n
+
+	def add(self, item):
+		if self.seen < self.n:
+			self.items.append(item)
+			if len(self.items) == self.n:
+				self._skip()
+		elif self.seen == self.next:
+			self.items[self.rng.randrange(self.n)] = item
+			self._skip()
+		self.seen += 1
+
+	def _skip(self):
+		self.w *= math.exp(math.log(1.0 - self.rng.random()) / self.n)
+		self.next = self.seen + math.floor(math.log(1.0 - self.rng.random()) / math.log(1.0 - self.w)) + 1
+
+
+def corpora(config, sample_dir):
+	"""(name, run_pipeline kwargs) per corpus, with its outputs moved to sample_dir."""
+	if not config.get("inputs"):
+		name = os.path.basename(config["output"])
+		return [(name, dict(single_corpus_kwargs(config), output_path=os.path.join(sample_dir, name)))]
+	return [(inp["name"], single_input_kwargs(inp, config, sample_dir)) for inp in config["inputs"]]
+
+
+def source_rows(kwargs):
+	"""(header, rows) of the TSV the first step of a corpus reads: its formatted input or start_from."""
+	path = kwargs["start_from"] or (None if "input" in kwargs["steps"] else kwargs["input_path"])
+	if path is None:
+		header, rows = input_formats.read_rows(
+			kwargs["input_path"], kwargs["l1"], kwargs["l2"], kwargs["format"],
+			kwargs["l1_column"], kwargs["l2_column"], kwargs["score_columns"])
+		return "\t".join(header), rows
+
+	with fileio.open_file(path, "r", encoding="utf-8") as f:
+		header = f.readline().rstrip("\n")
+
+	def rows():
+		with fileio.open_file(path, "r", encoding="utf-8") as f:
+			next(f, None)
+			for line in f:
+				yield line.rstrip("\n")
+
+	return header, rows()
+
+
+def draw(sources, n, seed):
+	"""
+	Reservoir-sample n rows over all corpora. Returns per corpus its header,
+	its sampled rows (in corpus order), its number of rows and the seconds
+	spent reading it.
+	"""
+	reservoir = Reservoir(n, random.Random(seed))
+	headers, totals, seconds = [], [], []
+	for k, (name, kwargs) in enumerate(sources):
+		start = time.monotonic()
+		header, rows = source_rows(kwargs)
+		before = reservoir.seen
+		for row in rows:
+			reservoir.add((reservoir.seen, k, row))
+		headers.append(header)
+		totals.append(reservoir.seen - before)
+		seconds.append(time.monotonic() - start)
+		print(f"[sample] Read {totals[-1]} pairs of {name} in {format_seconds(seconds[-1])}")
+	samples = [[] for _ in sources]
+	for _, k, row in sorted(reservoir.items):
+		samples[k].append(row)
+	return headers, samples, totals, seconds
+
+
+def count_rows(path, header_lines):
+	with fileio.open_file(path, "rb") as f:
+		return max(sum(1 for _ in f) - header_lines, 0)
+
+
+def distribution(values, threshold=None):
+	if not values:
+		return None
+	a = np.asarray(values, dtype=np.float64)
+	stats = {"n": len(a), "mean": float(a.mean()), "min": float(a.min()), "max": float(a.max())}
+	stats.update({f"p{q}": float(v) for q, v in zip(QUANTILES, np.percentile(a, QUANTILES))})
+	if threshold:
+		stats["threshold"] = threshold
+		stats["passes"] = float((a >= threshold).mean())
+	return stats
+
+
+def score_distributions(path, header_lines, names, thresholds):
+	"""Distributions of the last len(names) columns of path (the scores a step appended)."""
+	values = [[] for _ in names]
+	with fileio.open_file(path, "r", encoding="utf-8") as f:
+		for _ in zip(range(header_lines), f):
+			pass
+		for line in f:
+			for column, value in zip(values, line.rstrip("\n").split("\t")[-len(names):]):
+				try:
+					column.append(float(value))
+				except ValueError:
+					pass
+	return {name: distribution(column, thresholds.get(name)) for name, column in zip(names, values)}
+
+
+def startup_seconds(step, kwargs, current):
+	"""Time step takes on a header-only copy of its input: model loading and other fixed costs."""
+	if step not in STARTUP_STEPS:
+		return 0.0
+	prefix = kwargs["output_path"] + ".startup"
+	empty = prefix + ".input.tsv"
+	with fileio.open_file(current, "r", encoding="utf-8") as fin, open(empty, "w", encoding="utf-8") as fout:
+		fout.write(fin.readline())
+	start = time.monotonic()
+	run_pipeline(**dict(kwargs, input_path=None, steps=[step], start_from=empty, output_path=prefix,
+						vectors_path=None, save_vectors=False))
+	seconds = time.monotonic() - start
+	for path in glob.glob(glob.escape(prefix) + ".*"):
+		os.remove(path)
+	return seconds
+
+
+def project(record, scale):
+	"""Add the full-run estimates to a step record: per-row time, rows and bytes grow with scale."""
+	per_row = max(record["seconds"] - record["startup_seconds"], 0.0)
+	record["rows_per_s"] = record["rows_in"] / per_row if per_row and record["rows_in"] else None
+	record["projected_rows_out"] = round(record["rows_out"] * scale)
+	record["projected_seconds"] = record.get("read_seconds", 0.0) + record["startup_seconds"] + per_row * scale
+	record["projected_bytes"] = round(record["bytes"] * scale)
+	return record
+
+
+def run_steps(name, kwargs, start_from, rows, scale, thresholds, records):
+	"""
+	Run the steps of kwargs one at a time on the sample TSV start_from,
+	appending a record per step to records. Returns the last output, its pair
+	vectors and its number of rows.
+	"""
+	current, vectors, done = start_from, kwargs.get("vectors_path"), []
+	for step in kwargs["steps"]:
+		if step == "input":
+			continue
+		if step == "bifixer" and not bifixer.is_available():
+			print("[sample] Bifixer not available, step omitted.")
+			continue
+		startup = startup_seconds(step, kwargs, current)
+		start = time.monotonic()
+		output = run_pipeline(**dict(kwargs, input_path=None, steps=[step], start_from=current, vectors_path=vectors))
+		seconds = time.monotonic() - start
+
+		files = [output, fileio.index_path(output)]
+		if step in ("embeddings", "semantic_dedup") and kwargs["save_vectors"]:
+			vectors = embeddings.vectors_path(output)
+			files.append(vectors)
+		elif step not in VECTOR_ALIGNED_STEPS:
+			vectors = None
+		done.append(step)
+		header_lines = shard_header_lines(done)
+		rows_out = count_rows(output, header_lines)
+		record = {
+			"corpus": name, "step": step, "rows_in": rows, "rows_out": rows_out,
+			"yield": rows_out / rows if rows else None, "seconds": seconds, "startup_seconds": startup,
+			"bytes": sum(os.path.getsize(p) for p in files if os.path.exists(p)),
+		}
+		if step in STEP_COLUMNS:
+			record["scores"] = score_distributions(output, header_lines, STEP_COLUMNS[step]["adds"], thresholds)
+		records.append(project(record, scale))
+		current, rows = output, rows_out
+	return current, vectors, rows
+
+
+def run_sample(config, n, seed=0):
+	"""
+	Run the config's steps on n pairs sampled from its inputs and report
+	yields, score distributions, throughput and full-run projections.
+	Outputs and <sample_dir>/sample.json go to sample_dir (default: the
+	output path + ".sample").
+	"""
+	sample_dir = config.get("sample_dir") or config["output"].rstrip("/") + ".sample"
+	ensure_dir(sample_dir)
+	ext = fileio.compression_suffix(config.get("compression"))
+	thresholds = {}
+	if "filter" in config.get("steps", []):
+		thresholds = {name: config.get(key) for name, key in FILTER_THRESHOLDS.items() if config.get(key)}
+
+	sources = corpora(config, sample_dir)
+	headers, samples, totals, read_seconds = draw(sources, n, seed)
+	sampled = sum(len(rows) for rows in samples)
+	if not sampled:
+		raise ValueError("The configured inputs hold no pairs to sample")
+	scale = sum(totals) / sampled
+	report = {"sample_pairs": sampled, "total_pairs": sum(totals), "scale": scale, "seed": seed,
+			  "corpora": {}, "steps": []}
+
+	ends, end_vectors, final_rows = [], [], 0
+	for (name, kwargs), header, rows, total, seconds in zip(sources, headers, samples, totals, read_seconds):
+		if not rows:
+			print(f"[sample] No pairs of {name} in the sample")
+			continue
+		# a trial run never reuses outputs or touches the persistent dedup index
+		kwargs = dict(kwargs, cache=False, parallel_steps=1, dedup_index_update=False, tmx_pairs=None, tmx_pivot=None)
+		path = kwargs["output_path"] + STEP_SUFFIXES["input"] + ext
+		start = time.monotonic()
+		with fileio.TSVWriter(path, "sample") as out:
+			out.write(header + "\n")
+			for row in rows:
+				out.write(row + "\n")
+		write_seconds = time.monotonic() - start
+
+		names = header.split("\t")[2:]
+		report["corpora"][name] = {
+			"pairs": total, "sampled": len(rows), "read_seconds": seconds,
+			"scores": score_distributions(path, 1, names, thresholds) if names else {},
+		}
+		if "input" in kwargs["steps"] and not kwargs["start_from"]:
+			report["steps"].append(project({
+				"corpus": name, "step": "input", "rows_in": len(rows), "rows_out": len(rows), "yield": 1.0,
+				"seconds": write_seconds, "startup_seconds": 0.0, "read_seconds": seconds,
+				"bytes": os.path.getsize(path) + (os.path.getsize(fileio.index_path(path))
+												  if os.path.exists(fileio.index_path(path)) else 0),
+			}, scale))
+		end, vectors, rows_out = run_steps(name, kwargs, path, len(rows), scale, thresholds, report["steps"])
+		ends.append(end)
+		end_vectors.append(vectors)
+		final_rows += rows_out
+
+	merged_steps = [s for s in config.get("steps", []) if s in MERGED_STEPS]
+	if config.get("inputs") and merged_steps and ends:
+		vector_paths = end_vectors if "semantic_dedup" in merged_steps and None not in end_vectors else None
+		merged = merge_inputs(ends, sample_dir, vector_paths, ext)
+		kwargs = dict(merged_stage_kwargs(config, merged, sample_dir), cache=False, dedup_index_update=False)
+		vectors = os.path.join(sample_dir, "merged.vec") if vector_paths else None
+		_, _, final_rows = run_steps("merged", dict(kwargs, vectors_path=vectors), merged, final_rows,
+									 scale, thresholds, report["steps"])
+
+	report["projected"] = {
+		"seconds": sum(r["projected_seconds"] for r in report["steps"]),
+		"bytes": sum(r["projected_bytes"] for r in report["steps"]),
+		"rows_out": round(final_rows * scale),
+		"yield": final_rows / sampled,
+	}
+	with open(os.path.join(sample_dir, "sample.json"), "w", encoding="utf-8") as f:
+		json.dump(report, f, indent=2)
+	print_report(report)
+	print(f"[sample] Report written to {os.path.join(sample_dir, 'sample.json')}")
+	return report
+
+
+def print_report(report):
+	print(f"[sample] Sampled {report['sample_pairs']} of {report['total_pairs']} pairs "
+		  f"(1 in {report['scale']:.1f}, seed {report['seed']})")
+	print(f"[sample] {'step':<32}{'rows in':>10}{'rows out':>10}{'yield':>8}{'rows/s':>10}"
+		  f"{'start-up':>10}{'full run':>11}{'disk':>10}")
+	for r in report["steps"]:
+		rate = f"{r['rows_per_s']:.0f}" if r["rows_per_s"] else "-"
+		print(f"[sample] {r['corpus'] + ':' + r['step']:<32}{r['rows_in']:>10}{r['rows_out']:>10}"
+			  f"{format_ratio(r['yield']):>8}{rate:>10}{format_seconds(r['startup_seconds']):>10}"
+			  f"{format_seconds(r['projected_seconds']):>11}{format_bytes(r['projected_bytes']):>10}")
+
+	scores = [(name, c["scores"]) for name, c in report["corpora"].items()]
+	scores += [(f"{r['corpus']}:{r['step']}", r["scores"]) for r in report["steps"] if r.get("scores")]
+	for where, columns in scores:
+		for column, d in columns.items():
+			if d is None:
+				continue
+			quantiles = " ".join(f"p{q} {d[f'p{q}']:.3f}" for q in QUANTILES)
+			line = f"[sample] {column} ({where}): mean {d['mean']:.3f} | {quantiles}"
+			if "passes" in d:
+				line += f" | >= {d['threshold']}: {format_ratio(d['passes'])}"
+			print(line)
+
+	if any(r["step"] in CORPUS_STEPS for r in report["steps"]):
+		print("[sample] Duplicates are rarer in a sample: expect dedup, semantic_dedup and cap_repeats "
+			  "to remove more in the full run")
+	p = report["projected"]
+	print(f"[sample] Projected full run: {format_seconds(p['seconds'])}, {format_bytes(p['bytes'])} of step outputs, "
+		  f"{p['rows_out']} pairs out of {report['total_pairs']} ({format_ratio(p['yield'])})")
+
+
+def format_ratio(value):
+	return "-" if value is None else f"{value * 100:.1f}%"
+
+
+def format_seconds(seconds):
+	if seconds < 60:
+		return f"{seconds:.1f}s"
+	minutes, seconds = divmod(round(seconds), 60)
+	hours, minutes = divmod(minutes, 60)
+	days, hours = divmod(hours, 24)
+	if days:
+		return f"{days}d {hours:02d}h"
+	if hours:
+		return f"{hours}h {minutes:02d}m"
+	return f"{minutes}m {seconds:02d}s"
+
+
+def format_bytes(size):
+	for unit in ("B", "kB", "MB", "GB", "TB"):
+		if size < 1000 or unit == "TB":
+			return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+		size /= 1000
@@ -0,0 +1,210 @@
+# server.py
+import json
+import time
+import signal
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from cleaner import Cleaner
+
+# `pipeline.py serve`: a long-lived HTTP server around one Cleaner, so the
+# embedding model, the GlotLID detector and the normalisers stay loaded.
+#
+#	POST /clean  {"pairs": [["l1 sentence", "l2 sentence"], ...]}
+#	          -> {"pairs": [{"index": 0, "l1": ..., "l2": ..., "scores": {...}}, ...]}
+#	GET /stats   -> throughput and latency counters
+#
+# Concurrent requests are grouped into micro-batches: a batch is cleaned as
+# soon as it holds max_batch pairs or max_wait_ms after its first request
+# arrived, whichever comes first. Batches run one at a time on a worker
+# thread, so requests arriving meanwhile form the next batch. Pairs dropped
+# by a step (e.g. filter) are missing from the response; "index" gives the
+# position of each returned pair in the request.
+
+# steps that compare pairs with each other would mix requests in a batch
+CORPUS_STEPS = {"dedup", "semantic_dedup", "cap_repeats"}
+LATENCY_WINDOW = 10_000
+
+
+class ServeStats:
+	"""Counters since start-up, plus latency percentiles over the last LATENCY_WINDOW requests."""
+
+	def __init__(self):
+		self.started = time.monotonic()
+		self.requests = 0
+		self.pairs_in = 0
+		self.pairs_out = 0
+		self.batches = 0
+		self.busy = 0.0
+		self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+	def batch(self, n_requests, n_in, n_out, seconds):
+		self.requests += n_requests
+		self.pairs_in += n_in
+		self.pairs_out += n_out
+		self.batches += 1
+		self.busy += seconds
+
+	def snapshot(self):
+		uptime = time.monotonic() - self.started
+		latencies = sorted(self.latencies)
+
+		def percentile(p):
+			return round(latencies[min(int(p / 100 * len(latencies)), len(latencies) - 1)] * 1000, 2) if latencies else None
+
+		return {
+			"uptime_s": round(uptime, 1),
+			"requests": self.requests,
+			"pairs_in": self.pairs_in,
+			"pairs_out": self.pairs_out,
+			"batches": self.batches,
+			"mean_batch_pairs": round(self.pairs_in / self.batches, 1) if self.batches else 0,
+			"pairs_per_s": round(self.pairs_in / uptime, 1) if uptime else 0,
+			"busy_pairs_per_s": round(self.pairs_in / self.busy, 1) if self.busy else 0,
+			"utilisation": round(self.busy / uptime, 3) if uptime else 0,
+			"latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99),
+						   "max": round(latencies[-1] * 1000, 2) if latencies else None},
+		}
+
+
+class MicroBatcher:
+
+	def __init__(self, cleaner, max_batch=256, max_wait_ms=10):
+		self.cleaner = cleaner
+		self.max_batch = max_batch
+		self.max_wait = max_wait_ms / 1000
+		self.queue = asyncio.Queue()
+		self.stats = ServeStats()
+		# the models are used from one thread only
+		self.executor = ThreadPoolExecutor(max_workers=1)
+
+	async def submit(self, pairs):
+		"""Queue the pairs of one request and wait for their results."""
+		future = asyncio.get_running_loop().create_future()
+		await self.queue.put((pairs, future, time.monotonic()))
+		return await future
+
+	async def run(self):
+		loop = asyncio.get_running_loop()
+		while True:
+			batch = [await self.queue.get()]
+			size = len(batch[0][0])
+			deadline = loop.time() + self.max_wait
+			while size < self.max_batch:
+				timeout = deadline - loop.time()
+				if timeout <= 0:
+					break
+				try:
+					item = await asyncio.wait_for(self.queue.get(), timeout)
+				except asyncio.TimeoutError:
+					break
+				batch.append(item)
+				size += len(item[0])
+			await self._clean(loop, batch)
+
+	async def _clean(self, loop, batch):
+		items = [((r, i), l1, l2) for r, (pairs, _, _) in enumerate(batch) for i, (l1, l2) in enumerate(pairs)]
+		start = time.monotonic()
+		try:
+			cleaned = await loop.run_in_executor(self.executor, lambda: list(self.cleaner.process_tagged(items)))
+		except Exception as e:
+			for _, future, _ in batch:
+				if not future.done():
+					future.set_exception(e)
+			return
+		end = time.monotonic()
+
+		results = [[] for _ in batch]
+		for (r, i), text, scores in cleaned:
+			results[r].append({"index": i, **text, "scores": scores})
+		for (_, future, received), result in zip(batch, results):
+			self.stats.latencies.append(end - received)
+			if not future.done():
+				future.set_result(result)
+		self.stats.batch(len(batch), len(items), len(cleaned), end - start)
+
+
+class CleanServer:
+	"""Minimal HTTP/1.1 front end (keep-alive, JSON bodies) for a MicroBatcher."""
+
+	def __init__(self, batcher):
+		self.batcher = batcher
+
+	async def route(self, method, path, body):
+		if method == "GET" and path == "/stats":
+			return "200 OK", self.batcher.stats.snapshot()
+		if method == "POST" and path == "/clean":
+			try:
+				pairs = json.loads(body)["pairs"]
+				pairs = [(str(l1), str(l2)) for l1, l2 in pairs]
+			except (ValueError, KeyError, TypeError) as e:
+				return "400 Bad Request", {"error": f"Expected {{\"pairs\": [[l1, l2], ...]}}: {e}"}
+			try:
+				return "200 OK", {"pairs": await self.batcher.submit(pairs)}
+			except Exception as e:
+				return "500 Internal Server Error", {"error": str(e)}
+		return "404 Not Found", {"error": f"No route for {method} {path}"}
+
+	async def handle(self, reader, writer):
+		try:
+			while True:
+				request_line = await reader.readline()
+				if not request_line.strip():
+					break
+				method, path, _ = request_line.decode("latin-1").split(" ", 2)
+				headers = {}
+				while True:
+					line = await reader.readline()
+					if line in (b"\r\n", b"\n", b""):
+						break
+					name, _, value = line.decode("latin-1").partition(":")
+					headers[name.strip().lower()] = value.strip()
+				body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+				status, payload = await self.route(method, path.split("?", 1)[0], body)
+				data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+				writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+							 f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+				await writer.drain()
+				if headers.get("connection", "").lower() == "close":
+					break
+		except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			writer.close()
+
+
+async def serve_forever(config):
+	cleaner = Cleaner(config)
+	mixed = CORPUS_STEPS.intersection(cleaner.steps)
+	if mixed:
+		raise ValueError(f"Steps {sorted(mixed)} compare pairs across the corpus and cannot be served; "
+						 f"run them with pipeline.py")
+	batcher = MicroBatcher(cleaner, config.get("max_batch", 256), config.get("max_wait_ms", 10))
+	front = CleanServer(batcher)
+
+	if config.get("serve_socket"):
+		server = await asyncio.start_unix_server(front.handle, path=config["serve_socket"])
+		where = config["serve_socket"]
+	else:
+		host, port = config.get("serve_host", "127.0.0.1"), config.get("serve_port", 8080)
+		server = await asyncio.start_server(front.handle, host, port)
+		where = f"http://{host}:{port}"
+	print(f"[serve] Serving steps {cleaner.steps} on {where} "
+		  f"(max_batch={batcher.max_batch}, max_wait_ms={batcher.max_wait * 1000:g})")
+
+	stop = asyncio.Event()
+	loop = asyncio.get_running_loop()
+	for signum in (signal.SIGINT, signal.SIGTERM):
+		loop.add_signal_handler(signum, stop.set)
+	worker = asyncio.create_task(batcher.run())
+	async with server:
+		await stop.wait()
+	worker.cancel()
+	batcher.executor.shutdown(wait=False)
+	print(f"[serve] Stopped: {json.dumps(batcher.stats.snapshot())}")
+
+
+def serve(config):
+	"""Run the cleaning server of `pipeline.py serve` until SIGINT or SIGTERM."""
+	asyncio.run(serve_forever(config))
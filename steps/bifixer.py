@@ -1,10 +1,18 @@
 import subprocess
 import shutil
+import threading
+from .fileio import open_file, needs_stream
 
 def is_available() -> bool:
     """Check if bifixer is on PATH."""
     return shutil.which("bifixer") is not None
 
+def _feed(fin, pipe):
+	try:
+		shutil.copyfileobj(fin, pipe, 1 << 20)
+	finally:
+		pipe.close()
+
 def run(input_tsv, output_tsv, l1, l2, flags=None):
 	"""
 	Optional Bifixer step.
@@ -14,7 +22,21 @@ def run(input_tsv, output_tsv, l1, l2, flags=None):
 		print("[bifixer] Not installed. Skipping step.")
 	flags = flags or []
 	cols = ["--scol", "1", "--tcol", "2"]
+	streamed = needs_stream(input_tsv) or needs_stream(output_tsv)
 	try:
+		if streamed:
+			# Bifixer only reads plain files: stream through its stdin/stdout instead
+			cmd = ["bifixer", "-", "-", l1, l2] + cols + flags
+			print(f"[bifixer] Running: {' '.join(cmd)} < {input_tsv} > {output_tsv}")
+			with open_file(input_tsv, "rb") as fin, open_file(output_tsv, "wb") as fout:
+				proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+				feeder = threading.Thread(target=_feed, args=(fin, proc.stdin))
+				feeder.start()
+				shutil.copyfileobj(proc.stdout, fout, 1 << 20)
+				feeder.join()
+				if proc.wait() != 0:
+					raise subprocess.CalledProcessError(proc.returncode, cmd)
+			return
 		cmd = ["bifixer", input_tsv, output_tsv, l1, l2] + cols + flags
 		print(f"[bifixer] Running: {' '.join(cmd)}")
 		subprocess.run(cmd, check=True)
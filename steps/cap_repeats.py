@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import heapq
+import numpy as np
+import xxhash
+from .deduplicate import normalize_for_hash
+from .fileio import open_file, TSVWriter
+
+# Caps how many pairs may share the same (normalised) source or target
+# sentence, e.g. "Thank you very much." with thousands of translations.
+# Sentence frequencies are estimated with a Count-Min sketch, so memory is
+# fixed regardless of corpus size. Over-estimates only mean a few more
+# sentences are tracked exactly in the second pass; they never drop pairs.
+
+BLOCK = 100_000
+_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+class CountMinSketch:
+
+    def __init__(self, width_bits=22, depth=4, seed=0):
+        self.shift = np.uint64(64 - width_bits)
+        self.counts = np.zeros((depth, 1 << width_bits), dtype=np.uint32)
+        rng = np.random.default_rng(seed)
+        self.seeds = rng.integers(0, 2**63, size=depth, dtype=np.uint64)
+
+    def _rows(self, hashes):
+        for d, seed in enumerate(self.seeds):
+            yield d, ((hashes ^ seed) * _MULT) >> self.shift
+
+    def add(self, hashes):
+        for d, idx in self._rows(hashes):
+            np.add.at(self.counts[d], idx, 1)
+
+    def estimate(self, hashes):
+        return np.min([self.counts[d, idx] for d, idx in self._rows(hashes)], axis=0)
+
+
+def side_hashes(src, tgt):
+    """64-bit hashes of the normalised source and target sentence."""
+    return (xxhash.xxh64_intdigest("s\t" + normalize_for_hash(src)),
+            xxhash.xxh64_intdigest("t\t" + normalize_for_hash(tgt)))
+
+
+def has_score_column(header, score_column):
+    """
+    Whether header holds score_column. Without it every pair scores 0.0,
+    so the earliest pairs of a frequent sentence are kept; that is logged.
+    """
+    if score_column in header.rstrip("\r\n").split("\t"):
+        return True
+    print(f"[cap_repeats] No '{score_column}' column: keeping the earliest pairs of each "
+          f"frequent sentence (run embeddings before cap_repeats to keep the best ones)")
+    return False
+
+
+def row_keys(header, lines, score_column):
+    """
+    Yield (row, src_hash, tgt_hash, score) for the data lines below header.
+    score is 0.0 for every row if header has no score_column (see
+    has_score_column); a row with an unreadable score is an error.
+    """
+    header = header.rstrip("\r\n").split("\t")
+    col = header.index(score_column) if score_column in header else None
+    for row, line in enumerate(lines):
+        parts = line.rstrip("\r\n").split("\t")
+        if len(parts) < 2:
+            continue
+        score = 0.0
+        if col is not None:
+            try:
+                score = float(parts[col])
+            except (IndexError, ValueError):
+                raise ValueError(f"Line {row + 2} has no valid {score_column}: {line.strip()!r}")
+        yield (row, *side_hashes(parts[0], parts[1]), score)
+
+
+def _rows(tsv_path, score_column):
+    """Yield (row, src_hash, tgt_hash, score) for every data row."""
+    with open_file(tsv_path, "r", encoding="utf-8") as f_in:
+        yield from row_keys(next(f_in), f_in, score_column)
+
+
+def _blocks(rows):
+    block = []
+    for r in rows:
+        block.append(r)
+        if len(block) >= BLOCK:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def capped_rows(rows, max_repeats=10, width_bits=22, depth=4):
+    """
+    Rows to drop so that at most max_repeats pairs share a source or target
+    sentence. rows() returns a fresh iterator of row_keys tuples (it is read
+    twice). Returns (dropped_rows, number_of_frequent_sentences).
+    """
+    # 1) Count-Min sketch of sentence frequencies on each side
+    sketch = CountMinSketch(width_bits, depth)
+    for block in _blocks(rows()):
+        arr = np.array([(s, t) for _, s, t, _ in block], dtype=np.uint64)
+        sketch.add(arr[:, 0])
+        sketch.add(arr[:, 1])
+
+    # 2) Exact top-k heaps, only for sentences the sketch marks as frequent
+    heaps = {}
+    required = {}
+    for block in _blocks(rows()):
+        arr = np.array([(s, t) for _, s, t, _ in block], dtype=np.uint64)
+        s_heavy = sketch.estimate(arr[:, 0]) > max_repeats
+        t_heavy = sketch.estimate(arr[:, 1]) > max_repeats
+        for (row, s, t, score), hs, ht in zip(block, s_heavy, t_heavy):
+            if not (hs or ht):
+                continue
+            required[row] = int(hs) + int(ht)
+            item = (score, -row)
+            for key in ([s] if hs else []) + ([t] if ht else []):
+                heap = heaps.setdefault(key, [])
+                if len(heap) < max_repeats:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    # a frequent pair survives only if it is in the top-k of each frequent side
+    votes = {}
+    for heap in heaps.values():
+        for _, neg_row in heap:
+            votes[-neg_row] = votes.get(-neg_row, 0) + 1
+    dropped = {row for row, need in required.items() if votes.get(row, 0) < need}
+    return dropped, len(heaps)
+
+
+def cap_repeats(tsv_path: str, out_path: str, max_repeats: int = 10,
+                width_bits: int = 22, depth: int = 4,
+                score_column: str = "cosine_similarity"):
+    """
+    Keep at most max_repeats pairs per source sentence and per target sentence,
+    preferring the highest score_column (earliest row without one).
+    Output keeps the original row order.
+    """
+    with open_file(tsv_path, "r", encoding="utf-8") as f_in:
+        has_score_column(next(f_in, ""), score_column)
+    dropped, n_frequent = capped_rows(lambda: _rows(tsv_path, score_column),
+                                      max_repeats, width_bits, depth)
+
+    # 3) Copy everything else through in order
+    with open_file(tsv_path, "r", encoding="utf-8") as f_in, \
+         TSVWriter(out_path, "cap_repeats") as f_out:
+        f_out.write(next(f_in))
+        for row, line in enumerate(f_in):
+            if row not in dropped:
+                f_out.write(line)
+
+    print(f"[cap_repeats] Dropped {len(dropped)} pairs over the {max_repeats}-repeat cap "
+          f"({n_frequent} frequent sentences)")
+    return out_path
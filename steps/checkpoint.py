@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import signal
+import itertools
+import threading
+import contextlib
+from . import step_cache
+from .fileio import TSVWriter
+
+# Resumable row-by-row steps (embeddings, langid). Every INTERVAL seconds the
+# step flushes its outputs and records in <output>.ckpt how many input lines
+# it has consumed and how long each output file was at that point. SIGTERM
+# and SIGUSR1 (e.g. a scheduler's wall-clock limit) write a checkpoint before
+# the step exits. Rerunning the step on the same input truncates its outputs
+# to the recorded lengths and continues with the next input line.
+
+INTERVAL = 600
+SUFFIX = ".ckpt"
+SIGNALS = (signal.SIGTERM, signal.SIGUSR1)
+
+
+class Checkpoint:
+    """
+    Checkpoint state of one step run. Use as a context manager around the
+    step's writers (created with writer() / vectors()) and iterate the input
+    through rows(); on a clean exit the checkpoint file is removed.
+    """
+
+    def __init__(self, step, output_path, input_path, params=None, vectors_path=None, interval=None):
+        self.step = step
+        self.output_path = output_path
+        self.vectors_path = vectors_path
+        self.path = output_path + SUFFIX
+        self.interval = INTERVAL if interval is None else interval
+        self.out = None
+        self.vecfile = None
+        self.signum = None
+        self.handlers = {}
+        self.last = time.monotonic()
+        self.state = None
+        if self.interval:
+            self.key = step_cache.fingerprint(
+                step=step, input=step_cache.path_fingerprint(input_path), params=params or {},
+                vectors=bool(vectors_path))
+            self.state = self._load()
+
+    @property
+    def resumed(self):
+        return self.state is not None
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("key") != self.key:
+            print(f"[{self.step}] Ignoring {self.path}: it was written for another input or settings")
+            return None
+        files = [(self.output_path, state["size"])]
+        if self.vectors_path:
+            files.append((self.vectors_path, state.get("vectors_size")))
+        for path, size in files:
+            if size is None or not os.path.exists(path) or os.path.getsize(path) < size:
+                print(f"[{self.step}] Ignoring {self.path}: {path} is shorter than checkpointed")
+                return None
+        for path, size in files:
+            os.truncate(path, size)
+        print(f"[{self.step}] Resuming from {self.path} after {state['input_lines']} input lines")
+        return state
+
+    def writer(self, **kwargs):
+        """TSVWriter for the step output, appending to the checkpointed part when resuming."""
+        resume = (self.state["lines"], self.state["bytes"]) if self.state else None
+        self.out = TSVWriter(self.output_path, self.step, resume=resume, **kwargs)
+        return self.out
+
+    def vectors(self):
+        """Raw file for the pair vectors (a null context without a vectors path)."""
+        if not self.vectors_path:
+            return contextlib.nullcontext()
+        self.vecfile = open(self.vectors_path, "ab" if self.state else "wb")
+        return self.vecfile
+
+    def rows(self, lines, start=1):
+        """
+        Yield (line_number, line) for the input lines after the header,
+        skipping those already processed before the checkpoint and saving a
+        checkpoint between rows when one is due.
+        """
+        done = self.state["input_lines"] if self.state else 0
+        for _ in itertools.islice(lines, done):
+            pass
+        for n, line in enumerate(lines, start=done):
+            if self.signum is not None or (self.interval and time.monotonic() - self.last >= self.interval):
+                self.save(n)
+            yield start + n, line
+
+    def save(self, input_lines):
+        """Flush the outputs and record that the first input_lines lines are done."""
+        state = {
+            "key": self.key,
+            "input_lines": input_lines,
+            "size": self.out.sync(),
+            "lines": self.out.lines,
+            "bytes": self.out.bytes,
+        }
+        if self.vecfile is not None:
+            self.vecfile.flush()
+            state["vectors_size"] = self.vecfile.tell()
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(self.path + ".tmp", self.path)
+        self.last = time.monotonic()
+        if self.signum is not None:
+            print(f"[{self.step}] Received signal {self.signum}; checkpointed {input_lines} input lines to {self.path}")
+            raise SystemExit(128 + self.signum)
+
+    def _on_signal(self, signum, frame):
+        self.signum = signum
+
+    def __enter__(self):
+        if self.interval and threading.current_thread() is threading.main_thread():
+            for signum in SIGNALS:
+                self.handlers[signum] = signal.signal(signum, self._on_signal)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for signum, handler in self.handlers.items():
+            signal.signal(signum, handler)
+        self.handlers = {}
+        if exc_type is None and os.path.exists(self.path):
+            os.remove(self.path)
+        if exc_type is None and self.signum is not None:
+            # arrived after the last row: the step is complete, pass it on
+            signal.raise_signal(self.signum)
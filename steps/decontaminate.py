@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import os
+import math
+import numpy as np
+import xxhash
+from .deduplicate import normalize_for_hash
+from .fileio import open_file, TSVWriter
+
+# Removes (or flags) pairs that overlap with held-out evaluation sets.
+# The evaluation index holds exact hashes of every normalised evaluation
+# sentence and the sorted hashes of its word n-grams, plus a Bloom filter of
+# those n-grams. The filter rules out most corpus n-grams cheaply; the ones
+# it lets through are looked up in the sorted hashes, so its false positives
+# never count as hits. The index is cached on disk, keyed by the checksums of
+# the evaluation files and the n-gram size.
+
+BLOCK = 50_000
+CACHE_DIR = os.path.expanduser("~/.cache/my_pipeline_decontam")
+
+
+def file_checksum(path):
+    h = xxhash.xxh64()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def ngram_hashes(norm, n):
+    words = norm.split()
+    return [xxhash.xxh64_intdigest(" ".join(words[i:i + n]))
+            for i in range(len(words) - n + 1)]
+
+
+class BloomFilter:
+
+    def __init__(self, bits, n_hashes):
+        self.bits = bits
+        self.n_hashes = n_hashes
+        self.n_bits = np.uint64(len(bits) * 8)
+
+    @classmethod
+    def for_items(cls, n_items, fp_rate=1e-4):
+        n_items = max(n_items, 1)
+        n_bits = int(-n_items * math.log(fp_rate) / math.log(2) ** 2) + 8
+        n_hashes = max(1, round(n_bits / n_items * math.log(2)))
+        return cls(np.zeros(n_bits // 8 + 1, dtype=np.uint8), n_hashes)
+
+    def _positions(self, hashes):
+        # double hashing from the two 32-bit halves of each 64-bit hash
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1, h2 = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+        for i in range(self.n_hashes):
+            yield (h1 + np.uint64(i) * h2) % self.n_bits
+
+    def add(self, hashes):
+        for pos in self._positions(hashes):
+            np.bitwise_or.at(self.bits, pos >> np.uint64(3), (1 << (pos & np.uint64(7))).astype(np.uint8))
+
+    def contains(self, hashes):
+        found = np.ones(len(hashes), dtype=bool)
+        for pos in self._positions(hashes):
+            found &= ((self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1) == 1
+        return found
+
+
+def build_index(eval_paths, ngram=8, cache_dir=CACHE_DIR):
+    """
+    Return (exact_hashes, bloom, gram_hashes) for the evaluation files, the
+    last a sorted array, loading it from the cache when the same files (by
+    checksum) were indexed before.
+    Every tab-separated field of every line counts as one evaluation sentence.
+    """
+    key = xxhash.xxh64("\t".join(sorted(file_checksum(p) for p in eval_paths)) + f"\t{ngram}").hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.npz")
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if "grams" in cached.files:  # older caches lack the exact n-grams
+            print(f"[decontaminate] Using cached evaluation index {cache_path}")
+            return (set(cached["exact"].tolist()), BloomFilter(cached["bloom"], int(cached["n_hashes"])),
+                    cached["grams"])
+
+    exact, grams = set(), set()
+    for path in eval_paths:
+        with open_file(path, "r", encoding="utf-8") as f:
+            for line in f:
+                for sentence in line.rstrip("\r\n").split("\t"):
+                    norm = normalize_for_hash(sentence)
+                    if not norm:
+                        continue
+                    exact.add(xxhash.xxh64_intdigest(norm))
+                    grams.update(ngram_hashes(norm, ngram))
+
+    grams = np.sort(np.fromiter(grams, dtype=np.uint64, count=len(grams)))
+    bloom = BloomFilter.for_items(len(grams))
+    bloom.add(grams)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp.npz"
+    np.savez(tmp_path, exact=np.fromiter(exact, dtype=np.uint64, count=len(exact)),
+             bloom=bloom.bits, n_hashes=bloom.n_hashes, grams=grams)
+    os.replace(tmp_path, cache_path)
+    print(f"[decontaminate] Indexed {len(exact)} evaluation sentences, {len(grams)} {ngram}-grams")
+    return exact, bloom, grams
+
+
+def _hits(block, exact, bloom, eval_grams, ngram):
+    """Which rows of a block of (src, tgt) pairs overlap the evaluation sets."""
+    hit = np.zeros(len(block), dtype=bool)
+    grams, owners = [], []
+    for i, (src, tgt) in enumerate(block):
+        for sentence in (src, tgt):
+            norm = normalize_for_hash(sentence)
+            if xxhash.xxh64_intdigest(norm) in exact:
+                hit[i] = True
+            g = ngram_hashes(norm, ngram)
+            grams.extend(g)
+            owners.extend([i] * len(g))
+    if grams and len(eval_grams):
+        grams = np.array(grams, dtype=np.uint64)
+        candidates = np.flatnonzero(bloom.contains(grams))
+        pos = np.minimum(np.searchsorted(eval_grams, grams[candidates]), len(eval_grams) - 1)
+        found = candidates[eval_grams[pos] == grams[candidates]]
+        hit[np.array(owners)[found]] = True
+    return hit
+
+
+def flag_lines(lines, exact, bloom, eval_grams, ngram=8):
+    """Yield (line, is_hit) for data lines (without line break), checked in blocks of BLOCK."""
+    def check(block):
+        pairs = []
+        for line in block:
+            parts = line.split("\t", 2)
+            pairs.append((parts[0], parts[1] if len(parts) > 1 else ""))
+        return zip(block, _hits(pairs, exact, bloom, eval_grams, ngram))
+
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= BLOCK:
+            yield from check(block)
+            block = []
+    if block:
+        yield from check(block)
+
+
+def decontaminate(tsv_path: str, out_path: str, eval_paths, mode: str = "drop",
+                  ngram: int = 8, cache_dir: str = CACHE_DIR):
+    """
+    Stream the corpus once and drop pairs whose source or target matches an
+    evaluation sentence exactly (after normalize_for_hash) or shares a word
+    n-gram with one. mode="flag" keeps every pair and appends a
+    'contaminated' column (1/0) instead.
+    """
+    if mode not in ("drop", "flag"):
+        raise ValueError(f"Unsupported decontamination mode: {mode}")
+    exact, bloom, eval_grams = build_index(eval_paths, ngram, cache_dir)
+
+    n_hits = 0
+    with open_file(tsv_path, "r", encoding="utf-8") as f_in, \
+         TSVWriter(out_path, "decontaminate") as f_out:
+        header = next(f_in).rstrip("\r\n")
+        f_out.write(header + ("\tcontaminated\n" if mode == "flag" else "\n"))
+        for line, is_hit in flag_lines((line.rstrip("\r\n") for line in f_in), exact, bloom, eval_grams, ngram):
+            n_hits += int(is_hit)
+            if mode == "flag":
+                f_out.write(f"{line}\t{int(is_hit)}\n")
+            elif not is_hit:
+                f_out.write(line + "\n")
+
+    print(f"[decontaminate] {'Flagged' if mode == 'flag' else 'Dropped'} {n_hits} contaminated pairs")
+    return out_path
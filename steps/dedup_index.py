@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import os
+import json
+import datetime
+import numpy as np
+
+# Persistent fingerprint index for cross-release deduplication.
+#
+# The index is a directory of sorted uint64 segment files (one per release)
+# plus a manifest.json. Version N of the index is the union of segments 1..N,
+# so older snapshots stay reproducible and appending a release only writes
+# the hashes that release added. Lookups are binary searches on memory-mapped
+# segments: the cost depends on the size of the new data, not on the history.
+# Once a version would be searched in more than COMPACT_AFTER segments, the
+# segments up to it are merged into one compacted segment, which versions
+# from then on search instead. The release segments are kept, so older
+# versions still resolve to exactly their own hashes.
+
+MANIFEST = "manifest.json"
+COMPACT_AFTER = 8
+MERGE_BLOCK = 1 << 22
+
+
+class HashIndex:
+
+    def __init__(self, path, version=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        manifest = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.versions = data["versions"]
+            self.compacted = data.get("compacted")
+        else:
+            self.versions = []
+            self.compacted = None
+        if version is None:
+            version = len(self.versions)
+        if version > len(self.versions):
+            raise ValueError(f"Index {path} has no version {version} (latest is {len(self.versions)})")
+        self.version = version
+        self.segments = self._load_segments(version)
+
+    def _load_segments(self, version):
+        """Memory-mapped segments holding exactly the hashes of versions 1..version."""
+        files = self.versions[:version]
+        if self.compacted and self.compacted["upto"] <= version:
+            files = [self.compacted] + self.versions[self.compacted["upto"]:version]
+        return [np.memmap(os.path.join(self.path, v["segment"]), dtype="<u8", mode="r")
+                for v in files if v["count"]]
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+    def contains(self, hashes):
+        """Boolean mask: which of the uint64 hashes are already in the index."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = np.zeros(len(hashes), dtype=bool)
+        for seg in self.segments:
+            pos = np.searchsorted(seg, hashes)
+            pos[pos == len(seg)] = len(seg) - 1
+            found |= seg[pos] == hashes
+        return found
+
+    def writer(self):
+        """Open a new segment; hashes must be appended in ascending order."""
+        if self.version != len(self.versions):
+            raise ValueError("Can only append to the latest version of the index")
+        return SegmentWriter(self)
+
+    def _commit(self, segment, count):
+        self.versions.append({
+            "version": len(self.versions) + 1,
+            "segment": segment,
+            "count": count,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        })
+        self._write_manifest()
+        self.version = len(self.versions)
+        self.segments = self._load_segments(self.version)
+
+    def compact(self):
+        """Merge the segments of the latest version into one compacted segment."""
+        if self.version != len(self.versions):
+            raise ValueError("Can only compact the latest version of the index")
+        previous = self.compacted
+        segment = f"compact-{self.version:05d}.u64"
+        tmp = os.path.join(self.path, segment + ".tmp")
+        with open(tmp, "wb") as f:
+            count = merge_sorted(self.segments, f)
+        os.replace(tmp, os.path.join(self.path, segment))
+        self.compacted = {"upto": self.version, "segment": segment, "count": count}
+        self._write_manifest()
+        n_merged = len(self.segments)
+        self.segments = self._load_segments(self.version)
+        if previous and previous["segment"] != segment:
+            os.remove(os.path.join(self.path, previous["segment"]))
+        print(f"[dedup_index] Compacted {n_merged} segments ({count} hashes) of {self.path}")
+
+    def _write_manifest(self):
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"versions": self.versions, "compacted": self.compacted}, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+
+def merge_sorted(segments, out_file, block=MERGE_BLOCK):
+    """
+    Write the sorted union of sorted uint64 arrays to out_file, block by block:
+    every block covers the same value range in all arrays, so repeats meet in
+    one block and are written once. Returns the number of hashes written.
+    """
+    if not segments:
+        return 0
+    bounds = max(segments, key=len)[block::block]
+    starts = [0] * len(segments)
+    count = 0
+    for k in range(len(bounds) + 1):
+        parts = []
+        for i, seg in enumerate(segments):
+            end = int(np.searchsorted(seg, bounds[k])) if k < len(bounds) else len(seg)
+            parts.append(seg[starts[i]:end])
+            starts[i] = end
+        merged = np.unique(np.concatenate(parts))
+        merged.astype("<u8").tofile(out_file)
+        count += len(merged)
+    return count
+
+
+class SegmentWriter:
+
+    def __init__(self, index):
+        self.index = index
+        self.segment = f"{len(index.versions) + 1:05d}.u64"
+        self.file = open(os.path.join(index.path, self.segment), "wb")
+        self.count = 0
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype="<u8")
+        hashes.tofile(self.file)
+        self.count += len(hashes)
+
+    def close(self):
+        self.file.close()
+        self.index._commit(self.segment, self.count)
+        print(f"[dedup_index] Added {self.count} hashes as version {self.index.version} of {self.index.path}")
+        if len(self.index.segments) > COMPACT_AFTER:
+            self.index.compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(os.path.join(self.index.path, self.segment))
@@ -3,8 +3,17 @@ import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 import tempfile
 import subprocess
+import contextlib
+import heapq
+import json
+import numpy as np
 from fast_unidecode import unidecode
 import xxhash
+from . import dedup_index
+from .fileio import open_file, strip_compression, TSVWriter
+
+# Pairs looked up in the persistent index per batch
+INDEX_BATCH = 100_000
 
 # Aggressive normalization for deduplication
 remove_non_alpha = str.maketrans(
@@ -29,24 +38,53 @@ def get_rank(src: str, tgt: str) -> float:
         return 0.0
     return sum(ord(ch) for ch in text) / len(text)
 
-def deduplicate_tsv(tsv_path: str, out_path: str):
-    tmpdir = os.environ.get("TMPDIR") or os.environ.get("TMP") or "/tmp"
+def _drop_seen(batch, index, new_hashes):
+    """Return the payloads of a hash-sorted batch that the index does not hold yet."""
+    hashes = np.array([int(h, 16) for h, _ in batch], dtype=np.uint64)
+    seen = index.contains(hashes)
+    if new_hashes is not None:
+        new_hashes.add(hashes[~seen])
+    return [payload for (_, payload), is_seen in zip(batch, seen) if not is_seen]
+
+def _tmpdir():
+    return os.environ.get("TMPDIR") or os.environ.get("TMP") or "/tmp"
 
-    # 1) Stream TSV -> temp file with hash + rank + full line
-    with tempfile.NamedTemporaryFile(mode="w", delete=False, dir=tmpdir, encoding="utf-8") as tmp:
+def _hash_and_sort(tsv_path, preserve_order=False, row_filter=None):
+    """
+    Steps 1-2 of deduplication. Returns (header, sorted_file, last_line_number).
+    Each sorted line is hash + rank + payload, where payload is the full line
+    (the line row_filter returns, if given) or the row number.
+    row_filter(line) returns the line to keep or None, like the filter step's
+    filtering.filter_line.
+    Lines stay bytes; only the two sentences are decoded for hashing, and
+    the header and payload are returned/written unchanged.
+    """
+    tmpdir = _tmpdir()
+
+    # 1) Stream TSV -> temp file with hash + rank + full line (or row number)
+    n_lines = 0
+    with tempfile.NamedTemporaryFile(mode="wb", delete=False, dir=tmpdir) as tmp:
         tmp_name = tmp.name
-        with open(tsv_path, "r", encoding="utf-8") as f_in:
+        with open_file(tsv_path, "rb") as f_in:
             header = next(f_in)  # preserve header
+            if row_filter is not None:
+                header = b"\t".join(header.rstrip(b"\r\n").split(b"\t")[:2]) + b"\n"
             for line_number, line in enumerate(f_in, start=2):
-                line = line.rstrip("\r\n")
-                parts = line.split("\t")
+                n_lines = line_number
+                line = line.rstrip(b"\r\n")
+                parts = line.split(b"\t", 2)
                 if len(parts) < 2:
-                    print(f"[Warning] skipping malformed line {line_number}: {line}")
+                    print(f"[Warning] skipping malformed line {line_number}: {line.decode('utf-8', 'replace')}")
                     continue
-                s_line, t_line = parts[0], parts[1]
+                s_line, t_line = parts[0].decode("utf-8"), parts[1].decode("utf-8")
+                if row_filter is not None:
+                    line = row_filter(line, line_number)
+                    if line is None:
+                        continue
                 h = get_hash(s_line, t_line)
                 r = get_rank(s_line, t_line)
-                tmp.write(f"{h}\t{r:.6f}\t{line}\n")
+                payload = str(line_number).encode() if preserve_order else line
+                tmp.write(f"{h}\t{r:.6f}\t".encode() + payload + b"\n")
 
     # 2) External sort: stable, by hash asc, then rank desc
     _, sorted_name = tempfile.mkstemp(dir=tmpdir)
@@ -58,28 +96,196 @@ def deduplicate_tsv(tsv_path: str, out_path: str):
         "-t", "\t",
         "-k1,1",     # hash
         "-k2,2nr",   # rank descending
-        tmp_name,
-        "-o", sorted_name
     ]
+    if preserve_order:
+        sort_cmd += ["-k3,3n"]  # earliest row wins ties
+    sort_cmd += [tmp_name, "-o", sorted_name]
     subprocess.run(sort_cmd, check=True, env=env)
+    os.remove(tmp_name)
+    return header, sorted_name, n_lines
+
+def _first_per_hash(sorted_lines, keep, index=None, new_hashes=None):
+    """
+    Step 3: walk hash-sorted lines and pass the payload of the first line of
+    each hash to keep(), dropping hashes already in the persistent index.
+    Returns the number of pairs dropped because the index held them.
+    """
+    seen_before = 0
+    last_hash = None
+    batch = []
+    for line in sorted_lines:
+        parts = line.rstrip(b"\n").split(b"\t", 2)
+        if len(parts) < 3:
+            continue
+        h, _rank, payload = parts
+        if h != last_hash:
+            last_hash = h
+            if index is None:
+                keep((payload,))
+                continue
+            batch.append((h, payload))
+            if len(batch) >= INDEX_BATCH:
+                unseen = _drop_seen(batch, index, new_hashes)
+                seen_before += len(batch) - len(unseen)
+                keep(unseen)
+                batch = []
+    if batch:
+        unseen = _drop_seen(batch, index, new_hashes)
+        seen_before += len(batch) - len(unseen)
+        keep(unseen)
+    return seen_before
+
+def deduplicate_tsv(tsv_path: str, out_path: str, index_path: str = None,
+                    update_index: bool = False, index_version: int = None,
+                    preserve_order: bool = False):
+    """
+    Exact deduplication on normalised (src, tgt) hashes.
+    index_path: optional persistent HashIndex of pairs shipped in earlier
+    releases; pairs found in it (at index_version, default latest) are dropped.
+    update_index: append the surviving hashes to the index as a new version.
+    preserve_order: write survivors in their original order instead of hash
+    order. Only row numbers are sorted; survivors are marked in a bitmap and
+    emitted by one sequential pass over the input.
+    """
+    header, sorted_name, n_lines = _hash_and_sort(tsv_path, preserve_order)
 
     # 3) Stream sorted file, keep first occurrence of each hash
-    with open(sorted_name, "r", encoding="utf-8") as fin, \
-         open(out_path, "w", encoding="utf-8") as fout:
-        fout.write(header)  # preserve original header
+    index = dedup_index.HashIndex(index_path, index_version) if index_path else None
+    keep_rows = bytearray(n_lines // 8 + 1) if preserve_order else None
+    with open(sorted_name, "rb") as fin, \
+         (contextlib.nullcontext() if preserve_order else TSVWriter(out_path, "dedup", binary=True)) as fout, \
+         (index.writer() if index is not None and update_index else contextlib.nullcontext()) as new_hashes:
+        if fout is not None:
+            fout.write(header)  # preserve original header
+
+        def keep(payloads):
+            for payload in payloads:
+                if preserve_order:
+                    row = int(payload)
+                    keep_rows[row >> 3] |= 1 << (row & 7)
+                else:
+                    fout.write(payload + b"\n")
+
+        seen_before = _first_per_hash(fin, keep, index, new_hashes)
+
+    if index is not None:
+        print(f"[dedup] Dropped {seen_before} pairs already present in {index_path}")
+
+    # 3b) One sequential pass emitting the marked rows in input order
+    if preserve_order:
+        with open_file(tsv_path, "rb") as f_in, \
+             TSVWriter(out_path, "dedup", binary=True) as fout:
+            fout.write(next(f_in))
+            for line_number, line in enumerate(f_in, start=2):
+                if keep_rows[line_number >> 3] & (1 << (line_number & 7)):
+                    fout.write(line if line.endswith(b"\n") else line + b"\n")
+
+    # 4) Cleanup temp files
+    try:
+        os.remove(sorted_name)
+    except OSError:
+        pass
+
+def dedup_lines(lines, index=None, preserve_order=False):
+    """
+    In-memory deduplicate_tsv over data lines (str, without line break):
+    the same survivor per hash (highest rank, then the smaller line, or the
+    earlier one with preserve_order) in the same output order.
+    index: optional HashIndex whose pairs are dropped (it is not updated).
+    Returns the positions in lines of the survivors, in output order.
+    """
+    best = {}
+    for row, line in enumerate(lines):
+        parts = line.split("\t", 2)
+        if len(parts) < 2:
+            print(f"[Warning] skipping malformed line {row + 2}: {line}")
+            continue
+        h = get_hash(parts[0], parts[1])
+        # sort -k2,2nr compares the rank as written, with 6 decimals
+        rank = float(f"{get_rank(parts[0], parts[1]):.6f}")
+        key = (-rank, row if preserve_order else line.encode("utf-8"))
+        if h not in best or key < best[h][0]:
+            best[h] = (key, row)
+
+    survivors = sorted(best.items())
+    if index is not None and survivors:
+        seen = index.contains(np.array([int(h, 16) for h, _ in survivors], dtype=np.uint64))
+        survivors = [item for item, is_seen in zip(survivors, seen) if not is_seen]
+    if preserve_order:
+        survivors.sort(key=lambda item: item[1][1])
+    return [row for _, (_, row) in survivors]
+
+# --- Two-level deduplication -------------------------------------------------
+# Each corpus is hashed, sorted and deduplicated once into a fingerprint run
+# (<name>.langid.run) during the per-corpus stage. The merged stage then only
+# k-way merges the runs, which is a single linear pass over already sorted data.
+
+def run_path(tsv_path):
+    """Fingerprint run that belongs to a per-corpus TSV."""
+    return os.path.splitext(strip_compression(tsv_path))[0] + ".run"
+
+def _run_params(tsv_path, filter_params):
+    st = os.stat(tsv_path)
+    return {"source": os.path.abspath(tsv_path), "size": st.st_size,
+            "mtime": st.st_mtime, "filter": filter_params}
+
+def build_run(tsv_path: str, out_path: str, row_filter=None, filter_params=None):
+    """
+    Write the hash-sorted, deduplicated fingerprint run of one corpus.
+    The run is reused as long as the source TSV and the filter_params
+    (the thresholds behind row_filter) are unchanged.
+    """
+    params = _run_params(tsv_path, filter_params)
+    meta_path = out_path + ".json"
+    if os.path.exists(out_path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == params:
+                print(f"[dedup] Reusing fingerprint run {out_path}")
+                return out_path
+
+    header, sorted_name, _ = _hash_and_sort(tsv_path, row_filter=row_filter)
+    with open(sorted_name, "rb") as fin, open(out_path, "wb") as fout:
+        fout.write(header)
         last_hash = None
         for line in fin:
-            parts = line.rstrip("\n").split("\t", 3)
-            if len(parts) < 4:
-                continue
-            h, _rank, s_line, t_line = parts
+            h = line.split(b"\t", 1)[0]
             if h != last_hash:
-                fout.write(f"{s_line}\t{t_line}\n")
+                fout.write(line)
                 last_hash = h
+    os.remove(sorted_name)
 
-    # 4) Cleanup temp files
-    for f in [tmp_name, sorted_name]:
-        try:
-            os.remove(f)
-        except OSError:
-            pass
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    print(f"[dedup] Fingerprint run written to {out_path}")
+    return out_path
+
+def _run_key(line):
+    # same order as `sort -k1,1 -k2,2nr` with its last-resort whole-line compare
+    h, rank, _ = line.split(b"\t", 2)
+    return h, -float(rank), line
+
+def merge_runs(run_paths, out_path: str, index_path: str = None,
+               update_index: bool = False, index_version: int = None):
+    """
+    Global deduplication of several fingerprint runs by one k-way merge-join.
+    Produces the same pairs as deduplicate_tsv over the concatenated corpora.
+    """
+    index = dedup_index.HashIndex(index_path, index_version) if index_path else None
+    with contextlib.ExitStack() as stack:
+        runs = [stack.enter_context(open(p, "rb")) for p in run_paths]
+        headers = [next(run, b"") for run in runs]
+        fout = stack.enter_context(TSVWriter(out_path, "dedup", binary=True))
+        new_hashes = stack.enter_context(
+            index.writer() if index is not None and update_index else contextlib.nullcontext())
+        fout.write(headers[0] if headers else b"")
+
+        def keep(payloads):
+            for payload in payloads:
+                fout.write(payload + b"\n")
+
+        seen_before = _first_per_hash(heapq.merge(*runs, key=_run_key), keep, index, new_hashes)
+
+    if index is not None:
+        print(f"[dedup] Dropped {seen_before} pairs already present in {index_path}")
+    print(f"[dedup] Merged {len(run_paths)} fingerprint runs into {out_path}")
+    return out_path
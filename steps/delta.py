@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import os
+import glob
+import json
+import shutil
+import xxhash
+from . import fileio
+
+# Incremental runs over append-only plain_text corpora. <output>.delta.json
+# records how many bytes of each source file were processed (always whole
+# lines, the same number in both files) and the xxh64 of that prefix. The
+# next run re-hashes the prefix: if it is unchanged, only the appended lines
+# go through the steps and their outputs are appended to the intermediates
+# already on disk; if it was rewritten, the corpus is processed from scratch.
+
+STATE_SUFFIX = ".delta.json"
+CHUNK = 1 << 24
+
+
+def is_appendable(path):
+    """Only plain local files can be extended in place (no globs, zip members or compression)."""
+    return (isinstance(path, str) and os.path.isfile(path) and not glob.has_magic(path)
+            and "::" not in path and fileio.strip_compression(path) == path)
+
+
+def load_state(output_path, params):
+    """The state of the last run with the same params, or None."""
+    try:
+        with open(output_path + STATE_SUFFIX, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("params") != params:
+        print(f"[delta] Settings changed since the last run of {output_path}; processing everything")
+        return None
+    for path, size in state["outputs"].items():
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            print(f"[delta] {path} changed since the last run; processing everything")
+            return None
+    return state
+
+
+def save_state(output_path, params, sources, outputs):
+    state = {
+        "params": params,
+        "sources": sources,
+        "outputs": {path: os.path.getsize(path) for path in outputs if os.path.exists(path)},
+    }
+    with open(output_path + STATE_SUFFIX + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(output_path + STATE_SUFFIX + ".tmp", output_path + STATE_SUFFIX)
+
+
+def _hash_range(f, h, start, end):
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = f.read(min(CHUNK, remaining))
+        if not chunk:
+            break
+        h.update(chunk)
+        remaining -= len(chunk)
+
+
+def scan(paths, previous=None):
+    """
+    Find the lines of the parallel files appended since previous (the
+    "sources" of a saved state; None to start from the beginning).
+    Returns a list of {"path", "start", "end", "checksum", "lines"} per file,
+    where [start, end) holds the same number of new whole lines in every
+    file and checksum is the xxh64 of [0, end). Returns None if a processed
+    prefix no longer matches its checksum.
+    """
+    previous = previous or [{"offset": 0, "checksum": xxhash.xxh64().hexdigest(), "lines": 0} for _ in paths]
+    files, hashes, counts = [], [], []
+    try:
+        for path, prev in zip(paths, previous):
+            f = open(path, "rb")
+            files.append(f)
+            size = os.fstat(f.fileno()).st_size
+            h = xxhash.xxh64()
+            if size < prev["offset"]:
+                print(f"[delta] {path} is shorter than its processed prefix")
+                return None
+            _hash_range(f, h, 0, prev["offset"])
+            if h.hexdigest() != prev["checksum"]:
+                print(f"[delta] The processed part of {path} was rewritten")
+                return None
+            hashes.append(h)
+            count = 0
+            for chunk in iter(lambda: f.read(CHUNK), b""):
+                count += chunk.count(b"\n")
+            counts.append(count)
+
+        # whole lines present in every file; a trailing partial line waits for the next run
+        n_new = min(counts)
+        ranges = []
+        for f, h, path, prev in zip(files, hashes, paths, previous):
+            f.seek(prev["offset"])
+            end, remaining = prev["offset"], n_new
+            while remaining:
+                chunk = f.read(CHUNK)
+                if not chunk:
+                    break
+                pos = -1
+                for _ in range(min(remaining, chunk.count(b"\n"))):
+                    pos = chunk.index(b"\n", pos + 1)
+                    remaining -= 1
+                end += len(chunk) if remaining else pos + 1
+            _hash_range(f, h, prev["offset"], end)
+            ranges.append({"path": path, "start": prev["offset"], "end": end,
+                           "checksum": h.hexdigest(), "lines": prev["lines"] + n_new})
+        return ranges
+    finally:
+        for f in files:
+            f.close()
+
+
+def extract_range(path, start, end, out_path):
+    """Copy bytes [start, end) of path to out_path."""
+    with open(path, "rb") as fin, open(out_path, "wb") as fout:
+        fin.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = fin.read(min(CHUNK, remaining))
+            if not chunk:
+                break
+            fout.write(chunk)
+            remaining -= len(chunk)
+    return out_path
+
+
+def append_rows(src_path, dest_path, skip_lines=1):
+    """
+    Append src_path, minus its first skip_lines lines (the header), to
+    dest_path. Compressed files get a new gzip member, xz stream or zstd frame.
+    """
+    with fileio.open_file(src_path, "rb") as fin, fileio.open_file(dest_path, "ab") as fout:
+        for _ in zip(range(skip_lines), fin):
+            pass
+        shutil.copyfileobj(fin, fout, fileio.WRITE_BUFFER)
+    if dest_path.endswith(".tsv") and fileio.INDEX_STRIDE:
+        fileio.build_index(dest_path)
+    return dest_path
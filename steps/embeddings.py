@@ -1,10 +1,19 @@
 
 # steps/embeddings.py
 import os
+import contextlib
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import csv
 from .mappings import get_flores_code
+from .fileio import open_file, strip_compression
+from .checkpoint import Checkpoint
+from . import step_cache
+
+# size of the sentence embeddings (and so of the pair vectors) of each model
+EMBEDDING_DIMS = {"labse": 768, "sonar": 1024}
+# sentences per forward pass when a list of lines is encoded at once
+ENCODE_BATCH_SIZE = 64
 
 def load_embedding_model(name, model_path=None):
 	"""
@@ -43,9 +52,9 @@ def load_embedding_model(name, model_path=None):
 					dtype=dtype or torch.float32,
 				)
 
-			def encode(self, sentences, lang="en"):
+			def encode(self, sentences, lang="en", batch_size=ENCODE_BATCH_SIZE):
 				flores_code = get_flores_code(lang)
-				embs = self.model.predict(sentences, source_lang=flores_code)
+				embs = self.model.predict(sentences, source_lang=flores_code, batch_size=batch_size)
 				return embs.cpu().numpy()
 
 		print("[embeddings] Loading SONAR text embedding model...")
@@ -55,36 +64,150 @@ def load_embedding_model(name, model_path=None):
 		raise ValueError(f"Unsupported embedding model: {name}")
 
 
-def add_embeddings(tsv_path, output_path, model, l1="en", l2="en"):
+def model_identity(name, model_path=None):
+	"""
+	What identifies the embeddings of a configured model, for checkpoint
+	keys: its name and, for a local copy, the path and a fingerprint of the
+	files in it (so a replaced or re-downloaded model does not match).
+	"""
+	if not model_path:
+		return {"model": name, "model_path": None}
+	return {"model": name, "model_path": os.path.abspath(model_path),
+			"revision": step_cache.path_fingerprint(model_path)}
+
+
+def vectors_path(tsv_path):
+	"""Sidecar file holding the pair vectors that belong to an embeddings TSV."""
+	return os.path.splitext(strip_compression(tsv_path))[0] + ".vec"
+
+
+def drop_vector_rows(path, n_rows, rows):
+	"""Remove the vectors of the given row positions from a vector file of n_rows rows."""
+	row_bytes = os.path.getsize(path) // n_rows
+	dropped = set(rows)
+	with open(path, "rb") as fin, open(path + ".tmp", "wb") as fout:
+		for row in range(n_rows):
+			vector = fin.read(row_bytes)
+			if row not in dropped:
+				fout.write(vector)
+	os.replace(path + ".tmp", path)
+
+
+def pair_vector(emb1, emb2):
+	"""
+	Single vector for a sentence pair: the normalised sum of both
+	normalised sides, stored as float16 to halve the disk footprint.
+	"""
+	v = emb1 / np.linalg.norm(emb1) + emb2 / np.linalg.norm(emb2)
+	norm = np.linalg.norm(v)
+	if norm > 0:
+		v = v / norm
+	return v.astype(np.float16)
+
+
+def embed_line(line, model, l1="en", l2="en", line_number=None):
+	"""
+	Score one TSV line (l1 <tab> l2 [<tab> other columns], without line break).
+	Returns (output_line, emb1, emb2), or None if the line is skipped.
+	"""
+	if not line:
+		return None
+	try:
+		l1_sent, l2_sent, *_ = line.split("\t")
+	except ValueError:
+		print(f"[Warning] Skipping malformed line {line_number}: {line}")
+		return None
+
+	# If it's SONAR, pass langs explicitly
+	if _takes_lang(model):
+		emb1 = model.encode([l1_sent], lang=l1)[0]
+		emb2 = model.encode([l2_sent], lang=l2)[0]
+	else:
+		# e.g. LaBSE — just encode directly
+		emb1, emb2 = model.encode([l1_sent, l2_sent])
+
+	return f"{line}\t{cosine(emb1, emb2)}", emb1, emb2
+
+
+def embed_lines(lines, model, l1="en", l2="en", start=1, batch_size=ENCODE_BATCH_SIZE):
+	"""
+	embed_line for a list of lines, numbered from start: all l1 sentences
+	and all l2 sentences are encoded with one model.encode call each.
+	Returns one (output_line, emb1, emb2) or None per line.
+	"""
+	pairs = []
+	for line_number, line in enumerate(lines, start=start):
+		if not line:
+			pairs.append(None)
+			continue
+		try:
+			l1_sent, l2_sent, *_ = line.split("\t")
+		except ValueError:
+			print(f"[Warning] Skipping malformed line {line_number}: {line}")
+			pairs.append(None)
+			continue
+		pairs.append((l1_sent, l2_sent))
+
+	valid = [pair for pair in pairs if pair is not None]
+	if not valid:
+		return pairs
+	l1_sents = [l1_sent for l1_sent, _ in valid]
+	l2_sents = [l2_sent for _, l2_sent in valid]
+	if _takes_lang(model):
+		embs1 = model.encode(l1_sents, lang=l1, batch_size=batch_size)
+		embs2 = model.encode(l2_sents, lang=l2, batch_size=batch_size)
+	else:
+		embs1 = model.encode(l1_sents, batch_size=batch_size)
+		embs2 = model.encode(l2_sents, batch_size=batch_size)
+
+	results = iter(zip(valid, embs1, embs2))
+	scored = []
+	for line, pair in zip(lines, pairs):
+		if pair is None:
+			scored.append(None)
+			continue
+		_, emb1, emb2 = next(results)
+		scored.append((f"{line}\t{cosine(emb1, emb2)}", emb1, emb2))
+	return scored
+
+
+def cosine(emb1, emb2):
+	return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+
+
+def _takes_lang(model):
+	return hasattr(model, "encode") and "lang" in model.encode.__code__.co_varnames
+
+
+def add_embeddings(tsv_path, output_path, model, l1="en", l2="en", vectors_path=None, model_id=None):
 	"""
 	Read a TSV file line by line, compute embeddings, and write out to a new TSV
 	with cosine similarity.
+	If vectors_path is given, the pair vector of every written row is appended
+	to it (raw float16, one row per TSV row) for semantic deduplication.
+	Progress is checkpointed (see steps.checkpoint), so an interrupted run
+	resumes where it stopped; model_id (see model_identity) keeps a checkpoint
+	from being resumed with another model.
 	"""
 	from sentence_transformers import SentenceTransformer
 
-	with open(tsv_path, "r", encoding="utf-8") as infile, \
-		 open(output_path, "w", encoding="utf-8") as outfile:
+	if model_id is None:
+		model_id = {"model": type(model).__name__}
+	ckpt = Checkpoint("embeddings", output_path, tsv_path, vectors_path=vectors_path,
+					  params={"l1": l1, "l2": l2, **model_id})
+	with open_file(tsv_path, "r", encoding="utf-8") as infile, ckpt, \
+		 ckpt.writer() as outfile, \
+		 ckpt.vectors() as vecfile:
 
 		header = infile.readline().rstrip("\n")
-		outfile.write(f"{header}\tcosine_similarity\n")
+		if not ckpt.resumed:
+			outfile.write(f"{header}\tcosine_similarity\n")
 
-		for line_number, line in enumerate(infile, start=2):
-			line = line.rstrip("\n")
-			if not line:
-				continue
-			try:
-				l1_sent, l2_sent = line.split("\t")
-			except ValueError:
-				print(f"[Warning] Skipping malformed line {line_number}: {line}")
+		for line_number, line in ckpt.rows(infile, start=2):
+			scored = embed_line(line.rstrip("\n"), model, l1, l2, line_number)
+			if scored is None:
 				continue
-
-			# If it's SONAR, pass langs explicitly
-			if hasattr(model, "encode") and "lang" in model.encode.__code__.co_varnames:
-				emb1 = model.encode([l1_sent], lang=l1)[0]
-				emb2 = model.encode([l2_sent], lang=l2)[0]
-			else:
-				# e.g. LaBSE — just encode directly
-				emb1, emb2 = model.encode([l1_sent, l2_sent])
-
-			cos_sim = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-			outfile.write(f"{l1_sent}\t{l2_sent}\t{cos_sim}\n")
+			out_line, emb1, emb2 = scored
+			outfile.write(out_line + "\n")
+			if vecfile is not None:
+				vecfile.write(pair_vector(emb1, emb2).tobytes())
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+import io
+import os
+import json
+import gzip
+import lzma
+import mmap
+import numpy as np
+
+# Compression is chosen by file extension, for reading and writing alike.
+COMPRESSION_SUFFIXES = {
+    None: "",
+    "none": "",
+    "gz": ".gz",
+    "gzip": ".gz",
+    "zst": ".zst",
+    "zstd": ".zst",
+    "xz": ".xz",
+}
+
+
+def compression_suffix(compression):
+    """File extension for a compression name from the config (e.g. 'zst' -> '.zst')."""
+    try:
+        return COMPRESSION_SUFFIXES[compression]
+    except KeyError:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+
+def strip_compression(path):
+    """X.tsv.zst -> X.tsv"""
+    root, ext = os.path.splitext(path)
+    return root if ext in (".gz", ".zst", ".xz") else path
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "zstd compression requested but not installed. "
+            "Install with `pip install zstandard`."
+        )
+    return zstandard
+
+
+def open_file(path, mode="r", encoding="utf-8", buffering=-1, level=3):
+    """
+    Drop-in replacement for open() that streams through gzip, zstd or xz
+    when the path ends in .gz, .zst or .xz. zstd compression uses all cores.
+    Uncompressed .tsv files opened for writing get a row index sidecar
+    (see RowIndex) built on the fly, unless INDEX_STRIDE is 0.
+    A .manifest path is read as the concatenation of the TSVs it lists.
+    """
+    if path.endswith(MANIFEST_SUFFIX) and "r" in mode:
+        stream = io.BufferedReader(_ConcatReader(read_manifest(path)), buffer_size=1 << 20)
+        return stream if "b" in mode else io.TextIOWrapper(stream, encoding=encoding)
+    if mode in ("w", "wb") and path.endswith(".tsv") and INDEX_STRIDE:
+        writer = io.BufferedWriter(_RowIndexer(path, INDEX_STRIDE), buffer_size=1 << 20)
+        return writer if mode == "wb" else io.TextIOWrapper(writer, encoding=encoding)
+    binary = "b" in mode
+    raw_mode = mode.replace("t", "").replace("b", "") + "b"
+    if path.endswith(".gz"):
+        stream = gzip.open(path, raw_mode, compresslevel=min(level + 3, 9))
+    elif path.endswith(".xz"):
+        stream = lzma.open(path, raw_mode)
+    elif path.endswith(".zst"):
+        zstandard = _zstd()
+        fh = open(path, raw_mode, buffering=buffering)
+        if raw_mode == "rb":
+            stream = io.BufferedReader(
+                zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True))
+        else:
+            stream = zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(fh)
+    elif binary:
+        return open(path, mode, buffering=buffering)
+    else:
+        return open(path, mode, encoding=encoding, buffering=buffering)
+
+    if binary:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
+def needs_stream(path):
+    """True if external tools cannot read path as a plain file (compressed or a manifest)."""
+    return strip_compression(path) != path or path.endswith(MANIFEST_SUFFIX)
+
+
+# --- Virtual concatenation ---------------------------------------------------
+# A <name>.manifest lists TSVs that are read as one logical file: the header
+# of the first, then the data rows of each in order. Merging corpora this way
+# costs no copy; headers are checked once, when the manifest is written.
+
+MANIFEST_SUFFIX = ".manifest"
+
+
+def write_manifest(paths, manifest_path):
+    """
+    Write a manifest for paths. Every part must have the same number of
+    columns and the same score column names (the language names may differ).
+    """
+    headers = []
+    for path in paths:
+        with open_file(path, "rb") as f:
+            headers.append(f.readline())
+    reference = headers[0].rstrip(b"\r\n").split(b"\t") if headers else []
+    for path, header in zip(paths, headers):
+        fields = header.rstrip(b"\r\n").split(b"\t")
+        if len(fields) != len(reference) or fields[2:] != reference[2:]:
+            raise ValueError(
+                f"Header of {path} ({header.decode('utf-8').strip()!r}) does not match "
+                f"{paths[0]} ({headers[0].decode('utf-8').strip()!r})")
+    manifest = {
+        "header": headers[0].decode("utf-8") if headers else "",
+        "parts": [os.path.abspath(p) for p in paths],
+        "sizes": [os.path.getsize(p) for p in paths],
+    }
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest_path
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for path, size in zip(manifest["parts"], manifest["sizes"]):
+        if os.path.getsize(path) != size:
+            raise ValueError(f"{path} changed since {manifest_path} was written")
+    return manifest
+
+
+class _ConcatReader(io.RawIOBase):
+    """Raw reader over the header plus the data rows of every manifest part."""
+
+    def __init__(self, manifest):
+        self.parts = list(manifest["parts"])
+        self.pending = manifest["header"].encode("utf-8")
+        self.current = None
+        self.last = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while True:
+            if self.pending:
+                n = min(len(b), len(self.pending))
+                b[:n] = self.pending[:n]
+                self.pending = self.pending[n:]
+                return n
+            if self.current is None:
+                if not self.parts:
+                    return 0
+                self.current = open_file(self.parts.pop(0), "rb")
+                self.current.readline()  # header, checked by write_manifest
+                self.last = b""
+            data = self.current.read(len(b))
+            if data:
+                b[:len(data)] = data
+                self.last = data[-1:]
+                return len(data)
+            self.current.close()
+            self.current = None
+            if self.last not in (b"", b"\n"):
+                self.pending = b"\n"
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super().close()
+
+
+# --- Bulk TSV writer ---------------------------------------------------------
+# Every step writes its output through TSVWriter: lines are collected in
+# memory and encoded and written in chunks of WRITE_BUFFER characters, so
+# there is one write call per chunk instead of one per pair.
+
+WRITE_BUFFER = 1 << 22
+
+# tab, newline and carriage return would break the TSV layout; NUL breaks sort
+TSV_FIELD_TABLE = str.maketrans({"\t": " ", "\n": " ", "\r": " ", "\x00": None})
+
+
+def clean_field(value):
+    """Make a value safe for a TSV field."""
+    return str(value).translate(TSV_FIELD_TABLE)
+
+
+def tsv_line(fields):
+    """Join fields into one TSV line (without line break), cleaning each of them."""
+    return "\t".join([clean_field(f) for f in fields])
+
+
+class TSVWriter:
+    """
+    Buffered text writer for step outputs. write() takes ready-made lines
+    (file-like, so print(..., file=) works); write_row() joins fields after
+    cleaning them with clean_field. Compression and the row index come
+    from open_file. On close the rows (lines after the header) and
+    uncompressed bytes written are reported under the step name.
+    With binary=True, write() takes bytes lines that are copied unchanged.
+    resume=(lines, bytes) appends to a file that already holds that many
+    lines and uncompressed bytes (see steps.checkpoint).
+    """
+
+    def __init__(self, path, step=None, buffer_size=None, binary=False, resume=None):
+        self.path = path
+        self.step = step
+        self.buffer_size = buffer_size or WRITE_BUFFER
+        self.binary = binary
+        self.resumed = resume is not None
+        self.file = open_file(path, "ab" if self.resumed else "wb")
+        self.pending = []
+        self.pending_size = 0
+        self.lines, self.bytes = resume or (0, 0)
+
+    @property
+    def rows(self):
+        return max(self.lines - 1, 0)
+
+    def write(self, text):
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.buffer_size:
+            self.flush()
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def write_row(self, fields):
+        self.write(tsv_line(fields) + "\n")
+
+    def write_rows(self, rows):
+        for fields in rows:
+            self.write_row(fields)
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.binary:
+            data = b"".join(self.pending)
+        else:
+            data = "".join(self.pending).encode("utf-8")
+        self.file.write(data)
+        self.lines += data.count(b"\n")
+        self.bytes += len(data)
+        self.pending = []
+        self.pending_size = 0
+
+    def sync(self):
+        """
+        Write out everything so far and return the file size on disk. A
+        compressed stream is ended and reopened for appending (a new gzip
+        member, xz stream or zstd frame), so the file up to that size is
+        complete on its own.
+        """
+        self.flush()
+        if strip_compression(self.path) != self.path:
+            self.file.close()
+            self.file = open_file(self.path, "ab")
+        else:
+            self.file.flush()
+        return os.path.getsize(self.path)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        if self.resumed and self.path.endswith(".tsv") and INDEX_STRIDE:
+            build_index(self.path)  # appending bypasses the on-the-fly index
+        if self.step:
+            print(f"[{self.step}] Wrote {self.rows} rows ({self.bytes / 1e6:.1f} MB) to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# --- Row index sidecar -------------------------------------------------------
+# <file>.tsv.idx holds a 4 x uint64 header (magic, stride, rows, file size)
+# followed by the byte offset of every stride-th data row (the TSV header
+# line is not a row). It gives O(1) row counts, byte-range sharding and
+# random row access through mmap without scanning the TSV.
+
+INDEX_STRIDE = 16
+INDEX_MAGIC = 0x31584449564F5752  # "RWOVIDX1"
+_INDEX_HEADER = 4
+
+
+def index_path(tsv_path):
+    return tsv_path + ".idx"
+
+
+class _RowIndexer(io.RawIOBase):
+    """Raw file writer that records row offsets as the bytes go through."""
+
+    def __init__(self, path, stride, raw=None):
+        self.path = path
+        self.stride = stride
+        self.raw = raw if raw is not None else open(path, "wb", buffering=0)
+        self.index = open(index_path(path) + ".tmp", "wb")
+        self.index.write(bytes(8 * _INDEX_HEADER))
+        self.pos = 0
+        self.newlines = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = self.raw.write(b)
+        chunk = np.frombuffer(memoryview(b)[:n], dtype=np.uint8)
+        starts = np.flatnonzero(chunk == 10)
+        if len(starts):
+            # newline number k ends the header (k=0) or data row k-1, so it
+            # marks the start of data row k
+            numbers = np.arange(self.newlines, self.newlines + len(starts))
+            keep = numbers % self.stride == 0
+            (starts[keep] + self.pos + 1).astype("<u8").tofile(self.index)
+            self.newlines += len(starts)
+        self.pos += n
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self.raw.close()
+        header = np.array([INDEX_MAGIC, self.stride, max(self.newlines - 1, 0), self.pos], dtype="<u8")
+        self.index.seek(0)
+        header.tofile(self.index)
+        self.index.close()
+        os.replace(index_path(self.path) + ".tmp", index_path(self.path))
+
+
+def build_index(tsv_path, stride=None):
+    """Build the row index of an existing uncompressed TSV with one sequential pass."""
+    indexer = _RowIndexer(tsv_path, stride or INDEX_STRIDE or 16, raw=open(os.devnull, "wb", buffering=0))
+    with open(tsv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 24), b""):
+            indexer.write(chunk)
+    indexer.close()
+    return RowIndex.load(tsv_path)
+
+
+class RowIndex:
+
+    def __init__(self, tsv_path):
+        self.path = tsv_path
+        data = np.memmap(index_path(tsv_path), dtype="<u8", mode="r")
+        magic, self.stride, self.rows, self.size = (int(x) for x in data[:_INDEX_HEADER])
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{index_path(tsv_path)} is not a row index")
+        self.offsets = data[_INDEX_HEADER:]
+
+    @classmethod
+    def load(cls, tsv_path):
+        """The index of tsv_path, or None if missing or stale."""
+        try:
+            index = cls(tsv_path)
+        except (OSError, ValueError):
+            return None
+        if os.path.getsize(tsv_path) != index.size:
+            return None
+        return index
+
+    def __len__(self):
+        return self.rows
+
+    def shards(self, n_shards):
+        """Split the rows into n_shards balanced (start_row, end_row) ranges on stride boundaries."""
+        bounds = [min(round(self.rows * k / n_shards / self.stride) * self.stride, self.rows)
+                  for k in range(n_shards + 1)]
+        bounds[-1] = self.rows
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def byte_range(self, start_row, end_row):
+        """Byte range of rows [start_row, end_row); both must lie on stride boundaries (or end)."""
+        def offset(row):
+            if row >= self.rows:
+                return self.size
+            if row % self.stride:
+                raise ValueError(f"Row {row} is not on a stride boundary ({self.stride})")
+            return int(self.offsets[row // self.stride])
+        return offset(start_row), offset(end_row)
+
+    def iter_rows(self, start_row=0, end_row=None):
+        """Yield the raw lines (bytes, with newline) of rows [start_row, end_row) via mmap."""
+        end_row = self.rows if end_row is None else min(end_row, self.rows)
+        if start_row >= end_row:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = int(self.offsets[start_row // self.stride])
+            for row in range(start_row - start_row % self.stride, end_row):
+                nl = mm.find(b"\n", pos)
+                end = len(mm) if nl < 0 else nl + 1
+                if row >= start_row:
+                    yield mm[pos:end]
+                pos = end
+
+    def row(self, i):
+        """Random access to a single row (bytes, without newline)."""
+        return next(self.iter_rows(i, i + 1)).rstrip(b"\r\n")
+
+
+def shard_ranges(tsv_path, n_shards):
+    """
+    Split the data rows of a TSV into n_shards balanced, contiguous ranges.
+    Returns [(start_row, end_row, byte_range)], where byte_range comes from
+    the row index for uncompressed files and is None for compressed ones.
+    """
+    if strip_compression(tsv_path) == tsv_path:
+        index = RowIndex.load(tsv_path) or build_index(tsv_path)
+        return [(start, end, index.byte_range(start, end)) for start, end in index.shards(n_shards)]
+    with open_file(tsv_path, "rb") as f:
+        next(f, None)
+        rows = sum(1 for _ in f)
+    return [(rows * k // n_shards, rows * (k + 1) // n_shards, None) for k in range(n_shards)]
+
+
+def extract_rows(tsv_path, out_path, start_row, end_row, byte_range=None):
+    """
+    Write the header plus rows [start_row, end_row) of a TSV to out_path.
+    With a byte_range the rows are copied directly; otherwise the file is
+    streamed up to end_row.
+    """
+    with open_file(tsv_path, "rb") as f, open_file(out_path, "wb") as out:
+        out.write(next(f, b""))
+        if byte_range is not None:
+            begin, stop = byte_range
+            f.seek(begin)
+            remaining = stop - begin
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 24))
+                if not chunk:
+                    break
+                out.write(chunk)
+                remaining -= len(chunk)
+            return out_path
+        for row, line in enumerate(f):
+            if row >= end_row:
+                break
+            if row >= start_row:
+                out.write(line)
+    return out_path
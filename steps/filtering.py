@@ -1,46 +1,71 @@
 #!/usr/bin/env python3
-import csv
 import json
+from .fileio import open_file, TSVWriter
+
+def passes_filters(rest, alignment_thresh, langid_l1_thresh, langid_l2_thresh):
+    """
+    Check the score columns that follow the two sentences
+    (cosine_similarity, l1_prob, l2_prob) against the thresholds.
+    Missing columns count as passing.
+    """
+    # 1) Alignment score filter
+    if alignment_thresh > 0.0:
+        # assume the alignment score is the last column if present
+        align_score = float(rest[0]) if rest else 1.0
+        if align_score < alignment_thresh:
+            return False
+
+    # 2) Language ID filter
+    if langid_l1_thresh > 0.0:
+        l1_prob = float(rest[1]) if len(rest) > 1 else 1.0
+        if l1_prob < langid_l1_thresh:
+            return False
+
+    if langid_l2_thresh > 0.0:
+        l2_prob = float(rest[2]) if len(rest) > 2 else 1.0
+        if l2_prob < langid_l2_thresh:
+            return False
+
+    return True
+
+def filter_line(line, alignment_thresh, langid_l1_thresh, langid_l2_thresh, line_number=None):
+    """
+    The two sentences of a TSV line (bytes or str, without line break) if
+    its score columns pass the thresholds, else None.
+    """
+    tab = b"\t" if isinstance(line, bytes) else "\t"
+    l1_sent, sep, rest = line.partition(tab)
+    if not sep:
+        text = line.decode("utf-8", "replace") if isinstance(line, bytes) else line
+        print(f"[Warning] Skipping malformed line {line_number}: {text.strip()}")
+        return None
+    l2_sent, _, rest = rest.partition(tab)
+    rest = rest.split(tab) if rest else []
+
+    if not passes_filters(rest, alignment_thresh, langid_l1_thresh, langid_l2_thresh):
+        return None
+
+    # Passed all filters, keep the sentences as-is
+    return l1_sent + tab + l2_sent
 
 def apply_filters(input_path, output_path, alignment_thresh, langid_l1_thresh, langid_l2_thresh):
     """
     Stream TSV file, apply filters, and write passing rows to output.
     Only considers first two columns for language/text filters; can be extended.
+    Lines are handled as bytes: only the score columns are parsed and the two
+    sentences are copied through without decoding. The output header keeps
+    the two sentence columns of the input header.
     """
 
-    with open(input_path, "r", encoding="utf-8") as infile, \
-         open(output_path, "w", encoding="utf-8") as outfile:
-
-        reader = csv.reader(infile, delimiter="\t", quoting=csv.QUOTE_NONE)
-        writer = csv.writer(outfile, delimiter="\t", quoting=csv.QUOTE_MINIMAL)
-
-        # Write header
-        header = next(reader)
-
-        for line_number, row in enumerate(reader, start=2):
-            try:
-                l1_sent, l2_sent, *rest = row
-            except ValueError:
-                print(f"[Warning] Skipping malformed line {line_number}: {row}")
-                continue
-
-            # 1) Alignment score filter
-            if alignment_thresh > 0.0:
-                # assume the alignment score is the last column if present
-                align_score = float(rest[0]) if rest else 1.0
-                if align_score < alignment_thresh:
-                    continue
-
-            # 2) Language ID filter
-            if langid_l1_thresh > 0.0:
-                l1_prob = float(rest[1]) if len(rest) > 1 else 1.0
-                if l1_prob < langid_l1_thresh:
-                    continue
-
-            if langid_l2_thresh > 0.0:
-                l2_prob = float(rest[2]) if len(rest) > 2 else 1.0
-                if l2_prob < langid_l2_thresh:
-                    continue
-
-            # Passed all filters, write row as-is
-            writer.writerow([l1_sent, l2_sent])
+    with open_file(input_path, "rb") as infile, \
+         TSVWriter(output_path, "filter", binary=True) as outfile:
+
+        header = next(infile, None)
+        if header is not None:
+            outfile.write(b"\t".join(header.rstrip(b"\r\n").split(b"\t")[:2]) + b"\n")
+
+        for line_number, line in enumerate(infile, start=2):
+            kept = filter_line(line.rstrip(b"\r\n"), alignment_thresh, langid_l1_thresh,
+                               langid_l2_thresh, line_number)
+            if kept is not None:
+                outfile.write(kept + b"\n")
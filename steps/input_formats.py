@@ -5,8 +5,30 @@ import json
 from collections import Counter
 import csv
 import re
+import io
+import glob
+import fnmatch
+import shutil
+import threading
+import zipfile
 import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import date
+from .mappings import ISO639_3_SCRIPT_TO_ISO639_1
+from .fileio import open_file, strip_compression, RowIndex, build_index, TSVWriter, WRITE_BUFFER, clean_field, tsv_line
+
+
+def read_index_split(tsv_path, split, n_splits):
+	"""Yield the (l1, l2) pairs of row range split (1-based) of n_splits, using the row index."""
+	index = RowIndex.load(tsv_path) or build_index(tsv_path)
+	start, end = index.shards(n_splits)[split - 1]
+	for line_number, line in enumerate(index.iter_rows(start, end), start=start + 2):
+		try:
+			l1_sent, l2_sent = line.decode('utf-8').rstrip('\r\n').split('\t')[:2]
+			yield (l1_sent.strip(), l2_sent.strip())
+		except Exception as e:
+			print(f"Error at line {line_number}: {e}")
 
 
 class IOFormat:
@@ -21,7 +43,27 @@ class IOFormat:
 	def read(self) -> (str, str):
 		raise NotImplementedError()
 
+	def header(self):
+		"""Column names of the TSV convert() writes."""
+		return [self.l1, self.l2]
+
+	def rows(self):
+		"""The data rows (lists of fields) convert() writes below the header."""
+		for l1_sent, l2_sent in self.read():
+			if l1_sent == '' or l2_sent == '':
+				continue
+			yield [l1_sent, l2_sent]
+
+	def convert(self):
+		with TSVWriter(self.format, "input") as output:
+			output.write_row(self.header())
+			output.write_rows(self.rows())
+
 	def get_size(self):
+		# O(1) when the input TSV has a row index sidecar
+		index = RowIndex.load(self.input[0]) if len(self.input) == 1 else None
+		if index is not None:
+			return {"size_sentences": len(index)}
 		return {
 			"size_sentences": sum(1 for _ in self.read())
 		}
@@ -40,73 +82,272 @@ class IOFormat:
 	def write(self, l1_sent, l2_sent, cosine, output):
 		print(l1_sent, l2_sent, cosine, sep='\t', file=output)
 			
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+class TuTarget:
+	"""
+	Expat parser target that turns each <tu> into a {xml:lang: text} dict
+	without building a tree, so memory stays constant on multi-GB TMX.
+	Only the direct text of <seg> is kept (inline tag contents are dropped).
+	"""
+
+	def __init__(self):
+		self.units = []
+		self.tu = None
+		self.lang = None
+		self.seg = None
+		self.depth = 0
+
+	def start(self, tag, attrib):
+		if tag == "tu":
+			self.tu = {}
+		elif tag == "tuv":
+			self.lang = attrib.get(XML_LANG) or attrib.get("lang")
+		elif tag == "seg":
+			self.seg = []
+			self.depth = 0
+		elif self.seg is not None:
+			self.depth += 1
+
+	def end(self, tag):
+		if tag == "seg":
+			if self.tu is not None and self.lang:
+				self.tu[self.lang] = "".join(self.seg)
+			self.seg = None
+		elif self.seg is not None:
+			self.depth -= 1
+		elif tag == "tu":
+			if self.tu:
+				self.units.append(self.tu)
+			self.tu = None
+
+	def data(self, text):
+		if self.seg is not None and self.depth == 0:
+			self.seg.append(text)
+
+	def close(self):
+		return None
+
+
+def iter_tus(path, chunk_size=1 << 20):
+	"""Stream the translation units of one TMX file as {xml:lang: text} dicts."""
+	target = TuTarget()
+	parser = ET.XMLParser(target=target)
+	with open_file(path, "rb") as f:
+		for chunk in iter(lambda: f.read(chunk_size), b""):
+			parser.feed(chunk)
+			yield from target.units
+			target.units = []
+		parser.close()
+		yield from target.units
+
+
+def lang_variants(lang):
+	"""Lower-cased codes that identify lang in xml:lang (e.g. cat_Latn -> cat-latn, ca)."""
+	variants = {lang.lower().replace("_", "-")}
+	if lang in ISO639_3_SCRIPT_TO_ISO639_1:
+		variants.add(ISO639_3_SCRIPT_TO_ISO639_1[lang].lower())
+	return variants
+
+
+def lang_matches(xml_lang, variants):
+	"""Case-insensitive match that also accepts region variants (en-US for en)."""
+	tag = xml_lang.lower().replace("_", "-")
+	return any(tag == v or tag.startswith(v + "-") for v in variants)
+
+
+def pick_pair(tu, l1_variants, l2_variants):
+	"""Return (l1_text, l2_text) from a translation unit, None if a side is missing."""
+	l1_text = l2_text = None
+	for lang, text in tu.items():
+		if l1_text is None and lang_matches(lang, l1_variants):
+			l1_text = text
+		elif l2_text is None and lang_matches(lang, l2_variants):
+			l2_text = text
+	return l1_text, l2_text
+
+
+def _convert_tmx_file(args):
+	"""Worker: write the l1/l2 pairs of one TMX file to part_path, return the count."""
+	input_file_path, part_path, l1, l2 = args
+	reader = tmx([input_file_path], None, "tmx", l1, l2)
+	with TSVWriter(part_path) as output:
+		output.write_rows(reader.rows())
+	return output.lines
+
+
+def pair_output_path(output, l1, l2):
+	"""X.formatted.tsv[.zst] -> X.<l1>-<l2>.formatted.tsv[.zst]"""
+	suffix = ".formatted.tsv"
+	plain = strip_compression(output)
+	compression = output[len(plain):]
+	stem = plain[:-len(suffix)] if plain.endswith(suffix) else os.path.splitext(plain)[0]
+	return f"{stem}.{l1}-{l2}{suffix}{compression}"
+
+
+class PairWriters:
+	"""Lazily opened, buffered outputs for one TSV per language pair."""
+
+	def __init__(self, path_for, header=True):
+		self.path_for = path_for
+		self.header = header
+		self.files = {}
+		self.counts = {}
+
+	def write(self, l1, l2, l1_text, l2_text):
+		key = (l1, l2)
+		if key not in self.files:
+			self.files[key] = TSVWriter(self.path_for(l1, l2))
+			self.counts[key] = 0
+			if self.header:
+				self.files[key].write_row([l1, l2])
+		self.files[key].write_row([l1_text, l2_text])
+		self.counts[key] += 1
+
+	def close(self):
+		for f in self.files.values():
+			f.close()
+		return {key: (self.path_for(*key), n) for key, n in self.counts.items()}
+
+
+def extract_tu_pairs(tu, pair_variants, pivot_variants, pivot, clean):
+	"""Yield (l1, l2, l1_text, l2_text) for every requested pair present in a tu."""
+	for l1, l2, v1, v2 in pair_variants:
+		l1_text, l2_text = pick_pair(tu, v1, v2)
+		l1_text, l2_text = clean(l1_text), clean(l2_text)
+		if l1_text and l2_text:
+			yield l1, l2, l1_text, l2_text
+	if pivot_variants is None:
+		return
+	pivot_text = next((t for lang, t in tu.items() if lang_matches(lang, pivot_variants)), None)
+	pivot_text = clean(pivot_text)
+	if not pivot_text:
+		return
+	for lang, text in tu.items():
+		if lang_matches(lang, pivot_variants):
+			continue
+		text = clean(text)
+		if text:
+			# the full tag, so that regional variants (pt-BR, pt-PT) stay separate pairs
+			yield pivot, lang.lower().replace("_", "-"), pivot_text, text
+
+
+def _extract_tmx_file(args):
+	"""Worker: write the requested pairs of one TMX file to per-pair part files."""
+	input_file_path, path_for, pairs, pivot = args
+	reader = tmx([input_file_path], None, "tmx", None, None)
+	writers = PairWriters(path_for, header=False)
+	try:
+		reader._extract(input_file_path, pairs, pivot, writers)
+	finally:
+		written = writers.close()
+	return written
+
+
+class _PartPath:
+	"""Picklable path_for(l1, l2) for the part files of one input file."""
+
+	def __init__(self, output, index):
+		self.output = output
+		self.index = index
+
+	def __call__(self, l1, l2):
+		return f"{pair_output_path(self.output, l1, l2)}.part{self.index:03d}"
+
+
 class tmx(IOFormat):
-	def __init__(self, input_files, output, input_format, l1, l2, split=0):
+	def __init__(self, input_files, output, input_format, l1, l2, split=0, workers=None):
 		self.input = input_files
 		self.format = output
 		self.split_index = split
 		self.l1 = l1
 		self.l2 = l2
+		self.workers = workers
 
 	def clean_sentence(self, sentence):
-		return sentence.replace('\n', '').replace('\t', ' ').replace('\x00', '') if sentence else ''
+		return clean_field(sentence) if sentence else ''
+
+	def rows(self):
+		for l1_text, l2_text in self.read():
+			yield [l1_text, l2_text]
 
 	def convert(self):
-		with open(self.format, 'w', encoding='utf-8') as output:
-			print(self.l1, self.l2, sep='\t', file=output)
-			for input_file_path in self.input:
-				try:
-					context = ET.iterparse(input_file_path, events=("start", "end"))
-					context = iter(context)
-					for event, elem in context:
-						if event == 'end' and elem.tag == 'tu':
-							try:
-								tuv_elements = elem.findall('tuv')
-								l1_text = l2_text = None
-								for tuv in tuv_elements:
-									lang = tuv.attrib.get("{http://www.w3.org/XML/1998/namespace}lang")
-									seg = tuv.find('seg')
-									if seg is None:
-										continue
-									text = self.clean_sentence(seg.text)
-									if lang == self.l1:
-										l1_text = text
-									elif lang == self.l2:
-										l2_text = text
-								if l1_text and l2_text:
-									print(l1_text, l2_text, sep='\t', file=output, flush=True)
-							except AttributeError as e:
-								print(f"Error processing 'tu' element: {ET.tostring(elem, encoding='unicode')}")
-								print(f"AttributeError: {e}")
-							elem.clear()
-				except ET.ParseError as e:
-					print(f"Error parsing {input_file_path}: {e}")
+		if len(self.input) > 1:
+			return self.convert_parallel()
+		super().convert()
+
+	def convert_parallel(self):
+		"""Parse several TMX files in parallel and concatenate them in input order."""
+		parts = [f"{self.format}.part{i:03d}" for i in range(len(self.input))]
+		workers = self.workers or min(len(self.input), os.cpu_count() or 1)
+		jobs = [(path, part, self.l1, self.l2) for path, part in zip(self.input, parts)]
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			counts = list(pool.map(_convert_tmx_file, jobs))
+		with open_file(self.format, 'wb') as output:
+			output.write((tsv_line(self.header()) + "\n").encode("utf-8"))
+			for part in parts:
+				with open(part, 'rb') as fin:
+					shutil.copyfileobj(fin, output, WRITE_BUFFER)
+				os.remove(part)
+		print(f"[input] Parsed {len(self.input)} TMX files ({sum(counts)} pairs) with {workers} workers")
+
+	def convert_pairs(self, pairs=None, pivot=None):
+		"""
+		Single pass over multilingual TMX: parse each <tu> once and write one
+		.formatted.tsv per language pair. pairs is a list of (l1, l2); with
+		pivot, (pivot, x) is written for every other language x in the file.
+		Returns {(l1, l2): path}.
+		"""
+		pairs = [tuple(p) for p in pairs or []]
+		path_for = lambda l1, l2: pair_output_path(self.format, l1, l2)
+		if len(self.input) == 1:
+			writers = PairWriters(path_for)
+			try:
+				self._extract(self.input[0], pairs, pivot, writers)
+			finally:
+				written = writers.close()
+			return {key: path for key, (path, _) in written.items()}
+
+		workers = self.workers or min(len(self.input), os.cpu_count() or 1)
+		jobs = [(path, _PartPath(self.format, i), pairs, pivot) for i, path in enumerate(self.input)]
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			results = list(pool.map(_extract_tmx_file, jobs))
+
+		# concatenate the part files of every pair in input order
+		keys = list(dict.fromkeys(key for written in results for key in written))
+		for l1, l2 in keys:
+			with open_file(path_for(l1, l2), 'wb') as output:
+				output.write(f"{l1}\t{l2}\n".encode("utf-8"))
+				for written in results:
+					if (l1, l2) in written:
+						part = written[(l1, l2)][0]
+						with open(part, 'rb') as fin:
+							shutil.copyfileobj(fin, output, WRITE_BUFFER)
+						os.remove(part)
+		print(f"[input] Extracted {len(keys)} language pairs from {len(self.input)} TMX files")
+		return {key: path_for(*key) for key in keys}
+
+	def _extract(self, input_file_path, pairs, pivot, writers):
+		pair_variants = [(l1, l2, lang_variants(l1), lang_variants(l2)) for l1, l2 in pairs]
+		pivot_variants = lang_variants(pivot) if pivot else None
+		try:
+			for tu in iter_tus(input_file_path):
+				for pair in extract_tu_pairs(tu, pair_variants, pivot_variants, pivot, self.clean_sentence):
+					writers.write(*pair)
+		except ET.ParseError as e:
+			print(f"Error parsing {input_file_path}: {e}")
 
 	def read(self):
+		l1_variants, l2_variants = lang_variants(self.l1), lang_variants(self.l2)
 		for input_file_path in self.input:
 			try:
-				context = ET.iterparse(input_file_path, events=("start", "end"))
-				context = iter(context)
-				for event, elem in context:
-					if event == 'end' and elem.tag == 'tu':
-						try:
-							tuv_elements = elem.findall('tuv')
-							l1_text = l2_text = None
-							for tuv in tuv_elements:
-								lang = tuv.attrib.get("{http://www.w3.org/XML/1998/namespace}lang")
-								seg = tuv.find('seg')
-								if seg is None:
-									continue
-								text = self.clean_sentence(seg.text)
-								if lang == self.l1:
-									l1_text = text
-								elif lang == self.l2:
-									l2_text = text
-							if l1_text and l2_text:
-								yield (l1_text, l2_text)
-						except AttributeError as e:
-							print(f"Error processing 'tu': {ET.tostring(elem, encoding='unicode')}")
-						elem.clear()
+				for tu in iter_tus(input_file_path):
+					l1_text, l2_text = pick_pair(tu, l1_variants, l2_variants)
+					l1_text = self.clean_sentence(l1_text)
+					l2_text = self.clean_sentence(l2_text)
+					if l1_text and l2_text:
+						yield (l1_text, l2_text)
 			except ET.ParseError as e:
 				print(f"Error parsing {input_file_path}: {e}")
 
@@ -125,19 +366,6 @@ class tsv(IOFormat):
 			"output": self.format
 		}
 
-	# keep your existing methods
-	def convert(self):
-		with open(self.format, 'w', encoding='utf-8') as output:
-			print(self.l1, self.l2, sep='\t', file=output)
-			for l1_sent, l2_sent in self.read():
-				if l1_sent == '' or l2_sent == '':
-					continue
-				print(
-					l1_sent.replace('\t', ' ').replace('\x00', ''),
-					l2_sent.replace('\t', ' ').replace('\x00', ''),
-					sep='\t', file=output
-				)
-
 	def read(self):
 		maxInt = sys.maxsize
 		while True:
@@ -147,7 +375,7 @@ class tsv(IOFormat):
 			except OverflowError:
 				maxInt = int(maxInt / 10)
 
-		with open(self.input[0], 'r', encoding='utf-8') as file:
+		with open_file(self.input[0], 'r', encoding='utf-8') as file:
 			tsv_file = csv.reader(file, delimiter="\t", quoting=csv.QUOTE_NONE)
 			next(tsv_file, None)  # Skip header
 			for line_number, element in enumerate(tsv_file, start=1):
@@ -156,11 +384,16 @@ class tsv(IOFormat):
 				except Exception as e:
 					print(f"Error at line {line_number}: {e}")
 
-	def read_split(self, split):
+	def read_split(self, split, n_splits=None):
 		"""
 		Reads a single split file. Assumes self.input[0] is already the split file.
 		The 'split' argument is only used for bookkeeping (e.g., header handling).
+		With n_splits, self.input[0] is the whole TSV and split (1-based) selects
+		a balanced row range through its row index instead of a split file.
 		"""
+		if n_splits:
+			yield from read_index_split(self.input[0], split, n_splits)
+			return
 		maxInt = sys.maxsize
 		while True:
 			try:
@@ -170,7 +403,7 @@ class tsv(IOFormat):
 				maxInt = int(maxInt / 10)
 
 		header = split == 1  # If first split, optionally skip header
-		with open(self.input[0], 'r', encoding='utf-8') as file:
+		with open_file(self.input[0], 'r', encoding='utf-8') as file:
 			tsv_file = csv.reader(file, delimiter="\t", quoting=csv.QUOTE_NONE)
 			for line_number, element in enumerate(tsv_file, start=1):
 				if header:
@@ -182,46 +415,165 @@ class tsv(IOFormat):
 					print(f"Error at line {line_number}: {e}")
 
 
+# "archive.zip::member" addresses a file inside a zip archive (globs allowed)
+ZIP_SEP = "::"
+
+
+class ZipHandles:
+	"""
+	One open ZipFile per archive and thread; close() closes those of every
+	thread. Each reader uses its own ZipHandles, so closing it never touches
+	the archives another reader still has open.
+	"""
+
+	def __init__(self):
+		self.local = threading.local()
+		self.opened = []
+		self.lock = threading.Lock()
+
+	def get(self, path):
+		handles = self.local.__dict__.setdefault("handles", {})
+		if path not in handles:
+			handles[path] = zipfile.ZipFile(path)
+			with self.lock:
+				self.opened.append(handles[path])
+		return handles[path]
+
+	def close(self):
+		with self.lock:
+			for handle in self.opened:
+				handle.close()
+			self.opened = []
+			self.local = threading.local()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def expand_source(pattern, zips):
+	"""Expand a path, glob or archive.zip::member glob into a sorted list of sources."""
+	if ZIP_SEP in pattern:
+		archive, member = pattern.split(ZIP_SEP, 1)
+		names = sorted(n for n in zips.get(archive).namelist() if fnmatch.fnmatchcase(n, member))
+		sources = [f"{archive}{ZIP_SEP}{n}" for n in names]
+	elif glob.has_magic(pattern):
+		sources = sorted(glob.glob(pattern))
+	else:
+		return [pattern]
+	if not sources:
+		raise ValueError(f"{pattern} matches no files")
+	return sources
+
+
+def open_source(source, zips):
+	"""Open a plain/compressed file or a zip member (from zips) as text, without extracting."""
+	if ZIP_SEP in source:
+		archive, member = source.split(ZIP_SEP, 1)
+		return io.TextIOWrapper(zips.get(archive).open(member), encoding='utf-8')
+	return open_file(source, 'r', encoding='utf-8')
+
+
+def opus_zip_members(path, l1, l2):
+	"""Find the Corpus.l1-l2.l1 / .l2 members of an OPUS Moses zip archive."""
+	with zipfile.ZipFile(path) as archive:
+		names = [n for n in archive.namelist() if not n.endswith("/")]
+	found = []
+	for lang in (l1, l2):
+		variants = lang_variants(lang)
+		matches = [n for n in names if os.path.splitext(n)[1][1:].lower().replace("_", "-") in variants]
+		if len(matches) != 1:
+			raise ValueError(f"Expected one member for language '{lang}' in {path}, found {matches or 'none'}")
+		found.append(f"{path}{ZIP_SEP}{matches[0]}")
+	return found
+
+
+def _read_parallel_files(paths, zips):
+	"""Worker: read one (l1 file, l2 file) pair completely."""
+	with open_source(paths[0], zips) as file1, open_source(paths[1], zips) as file2:
+		return [(a.strip(), b.strip()) for a, b in zip(file1, file2)]
+
+
 class plain_text(IOFormat):
-	def __init__(self, input_files, output, input_format, l1, l2, split=0):
-		# input_files should be a list of two files
+	def __init__(self, input_files, output, input_format, l1, l2, split=0, workers=8):
+		# input_files should be a list of two files (paths, globs or zip members),
+		# or a single OPUS Moses zip archive
 		if isinstance(input_files, str):
 			self.input = [input_files]
 		else:
 			self.input = input_files
+		if len(self.input) == 1 and self.input[0].endswith(".zip"):
+			self.input = opus_zip_members(self.input[0], l1, l2)
 		if len(self.input) != 2:
 			raise ValueError("plain_text format expects exactly 2 input files for parallel corpora.")
 		self.format = output
 		self.l1 = l1
 		self.l2 = l2
 		self.split_index = split
+		self.workers = workers
+		self.file_pairs = None
+
+	def sources(self):
+		"""The (l1, l2) source pairs the inputs expand to; raises if a glob matches nothing."""
+		if self.file_pairs is None:
+			with ZipHandles() as zips:
+				l1_files = expand_source(self.input[0], zips)
+				l2_files = expand_source(self.input[1], zips)
+			if len(l1_files) != len(l2_files):
+				raise ValueError(
+					f"{self.input[0]} matches {len(l1_files)} files but {self.input[1]} matches {len(l2_files)}")
+			self.file_pairs = list(zip(l1_files, l2_files))
+		return self.file_pairs
 
 	def convert(self):
-		with open(self.format, 'w', encoding='utf-8') as output:
-			print(self.l1, self.l2, sep='\t', file=output)
-			for l1_sent, l2_sent in self.read():
-				if l1_sent == '' or l2_sent == '':
-					continue
-				print(
-					l1_sent.replace('\t', ' ').replace('\x00', ''),
-					l2_sent.replace('\t', ' ').replace('\x00', ''),
-					sep='\t', file=output
-				)
+		self.sources()  # fail on a bad glob before the output is created
+		super().convert()
 
 	def read(self):
-		with open(self.input[0], 'r', encoding='utf-8') as file1, \
-			 open(self.input[1], 'r', encoding='utf-8') as file2:
+		# the archives opened by this read and its worker threads
+		with ZipHandles() as zips:
+			yield from self._read(zips)
+
+	def _read(self, zips):
+		file_pairs = self.sources()
+		if len(file_pairs) > 1:
+			yield from self.read_many(file_pairs, zips)
+			return
+
+		l1_file, l2_file = file_pairs[0]
+		with open_source(l1_file, zips) as file1, open_source(l2_file, zips) as file2:
 			for line_number, (l1_sent, l2_sent) in enumerate(zip(file1, file2), start=1):
 				try:
 					yield (l1_sent.strip(), l2_sent.strip())
 				except Exception as e:
 					print(f"Error at line {line_number}: {e}")
 
-	def read_split(self, split):
+	def read_many(self, file_pairs, zips):
+		"""
+		Read many small file pairs with a thread pool, yielding their lines in
+		sorted file order. At most a few files per worker are held in memory.
+		"""
+		window = self.workers * 4
+		with ThreadPoolExecutor(max_workers=self.workers) as pool:
+			pending = deque()
+			for paths in file_pairs:
+				pending.append(pool.submit(_read_parallel_files, paths, zips))
+				if len(pending) >= window:
+					yield from pending.popleft().result()
+			while pending:
+				yield from pending.popleft().result()
+		print(f"[input] Read {len(file_pairs)} file pairs")
+
+	def read_split(self, split, n_splits=None):
+		if n_splits:
+			yield from read_index_split(self.format, split, n_splits)
+			return
 		header = split == 1
 		split_file = self.format.replace('.formatted', f'.formatted.{split:02d}')
 		
-		with open(split_file, 'r', encoding='utf-8') as file:
+		with open_file(split_file, 'r', encoding='utf-8') as file:
 			for line_number, line in enumerate(file, start=1):
 				if header:
 					header = False
@@ -232,14 +584,131 @@ class plain_text(IOFormat):
 				except Exception as e:
 					print(f"Error at line {line_number}: {e}")
 
+class columnar(IOFormat):
+	"""
+	Base for record-oriented inputs (Parquet, JSONL). Sentences come from
+	l1_column / l2_column; score_columns (a list of names, or a dict of
+	output name -> input column) are passed through after the sentences so
+	that a pre-scored dataset can start directly at `filter`.
+	"""
+
+	def __init__(self, input_files, output, input_format, l1, l2, split=0,
+				 l1_column="src", l2_column="tgt", score_columns=None, batch_size=65536):
+		self.input = [input_files] if isinstance(input_files, str) else input_files
+		self.format = output
+		self.l1 = l1
+		self.l2 = l2
+		self.split_index = split
+		self.l1_column = l1_column or "src"
+		self.l2_column = l2_column or "tgt"
+		if isinstance(score_columns, dict):
+			self.score_columns = dict(score_columns)
+		else:
+			self.score_columns = {c: c for c in score_columns or []}
+		self.batch_size = batch_size
+
+	@property
+	def columns(self):
+		return [self.l1_column, self.l2_column] + list(self.score_columns.values())
+
+	def read_batches(self):
+		"""Yield lists of per-column value lists, in self.columns order."""
+		raise NotImplementedError()
+
+	def read_records(self):
+		skipped = 0
+		for batch in self.read_batches():
+			for values in zip(*batch):
+				if values[0] is None or values[1] is None:
+					skipped += 1
+					continue
+				yield values
+		if skipped:
+			print(f"[input] Skipped {skipped} records without {self.l1_column}/{self.l2_column}")
+
+	def read(self):
+		for values in self.read_records():
+			yield (str(values[0]).strip(), str(values[1]).strip())
+
+	def header(self):
+		return [self.l1, self.l2] + list(self.score_columns)
+
+	def rows(self):
+		# a record without one of its scores is skipped: an empty field is not a score
+		# the later steps (filter, cap_repeats) could read
+		null_scores = 0
+		for values in self.read_records():
+			# cleaned before strip() so a trailing tab or newline does not become a space
+			l1_sent, l2_sent = clean_field(values[0]).strip(), clean_field(values[1]).strip()
+			if l1_sent == '' or l2_sent == '':
+				continue
+			if any(v is None for v in values[2:]):
+				null_scores += 1
+				continue
+			yield [l1_sent, l2_sent] + list(values[2:])
+		if null_scores:
+			print(f"[input] Skipped {null_scores} records with a null score in {list(self.score_columns.values())}")
+
+
+class parquet(columnar):
+
+	def read_batches(self):
+		try:
+			import pyarrow.parquet as pq
+		except ImportError:
+			raise ImportError(
+				"Parquet input requested but pyarrow is not installed. "
+				"Install with `pip install pyarrow`."
+			)
+		for path in self.input:
+			pf = pq.ParquetFile(path)
+			missing = [c for c in self.columns if c not in pf.schema_arrow.names]
+			if missing:
+				raise ValueError(f"{path} has no column(s) {missing}")
+			for batch in pf.iter_batches(batch_size=self.batch_size, columns=self.columns):
+				yield [batch.column(c).to_pylist() for c in self.columns]
+
+
+class jsonl(columnar):
+
+	def read_batches(self):
+		columns = self.columns
+		for path in self.input:
+			with open_file(path, 'r', encoding='utf-8') as file:
+				batch = []
+				for line_number, line in enumerate(file, start=1):
+					if not line.strip():
+						continue
+					try:
+						record = json.loads(line)
+					except json.JSONDecodeError as e:
+						print(f"Error at line {line_number} of {path}: {e}")
+						continue
+					batch.append([record.get(c) for c in columns])
+					if len(batch) >= self.batch_size:
+						yield list(zip(*batch))
+						batch = []
+				if batch:
+					yield list(zip(*batch))
+
+
 format_classes = {
 	"tsv": tsv,
 	"plain_text": plain_text,
 	"tmx": tmx,
-
+	"parquet": parquet,
+	"jsonl": jsonl,
 }
 
-def run(input_files, l1, l2, input_format="plain_text", output="formatted.tsv"):
+def run(input_files, l1, l2, input_format="plain_text", output="formatted.tsv",
+		tmx_pairs=None, tmx_pivot=None, l1_column=None, l2_column=None, score_columns=None):
+	"""
+	Convert the input to a two-column TSV at output.
+	For tmx, tmx_pairs / tmx_pivot extract further language pairs in the same
+	pass (to <name>.<l1>-<l2>.formatted.tsv); the (l1, l2) pair still goes to output.
+	For parquet / jsonl, l1_column / l2_column name the sentence columns and
+	score_columns are copied after them.
+	"""
 	if input_format not in format_classes:
 		raise ValueError(f"Unsupported input format: {input_format}")
 
@@ -247,15 +716,50 @@ def run(input_files, l1, l2, input_format="plain_text", output="formatted.tsv"):
 	if isinstance(input_files, str):
 		input_files = [input_files]
 
-	instance =  cls(input_files, output, input_format, l1, l2)
+	if issubclass(cls, columnar):
+		instance = cls(input_files, output, input_format, l1, l2, l1_column=l1_column,
+					   l2_column=l2_column, score_columns=score_columns)
+	else:
+		instance =  cls(input_files, output, input_format, l1, l2)
+	if input_format == "tmx" and (tmx_pairs or tmx_pivot):
+		pairs = [tuple(p) for p in tmx_pairs or []]
+		if (l1, l2) not in pairs:
+			pairs.append((l1, l2))
+		written = instance.convert_pairs(pairs, tmx_pivot)
+		if (l1, l2) in written:
+			os.replace(written[(l1, l2)], output)
+		else:
+			# no unit held both languages: keep the header-only file the pipeline expects
+			with TSVWriter(output) as f:
+				f.write(f"{l1}\t{l2}\n")
+		return output
 	instance.convert()
 	return output
 
+def read_rows(input_files, l1, l2, input_format="plain_text", l1_column=None, l2_column=None, score_columns=None):
+	"""
+	(header, rows) of the TSV run() would write, without writing it: header
+	is the list of column names and rows yields the data lines (no newline),
+	cleaned and joined like TSVWriter.write_row does.
+	"""
+	if input_format not in format_classes:
+		raise ValueError(f"Unsupported input format: {input_format}")
+	cls = format_classes[input_format]
+	if isinstance(input_files, str):
+		input_files = [input_files]
+
+	if issubclass(cls, columnar):
+		instance = cls(input_files, None, input_format, l1, l2, l1_column=l1_column,
+					   l2_column=l2_column, score_columns=score_columns)
+	else:
+		instance = cls(input_files, None, input_format, l1, l2)
+	return instance.header(), (tsv_line(fields) for fields in instance.rows())
+
 def save(data, output_path):
 	"""
 	Save a list of dicts with 'l1' and 'l2' keys to a TSV.
 	"""
-	with open(output_path, "w", encoding="utf-8") as f:
+	with TSVWriter(output_path) as f:
 		f.write("l1\tl2\n")
 		for record in data:
 			f.write(f"{record['l1']}\t{record['l2']}\n")
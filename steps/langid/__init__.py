@@ -1,4 +1,4 @@
-from .langid import score
+from .langid import score, model_identity
 from .langresolver import LangResolver
 
-__all__ = ["score", "LangResolver"]
+__all__ = ["score", "model_identity", "LangResolver"]
@@ -1,43 +1,107 @@
 import joblib
 import fasttext
-from huggingface_hub import hf_hub_download
+from huggingface_hub import hf_hub_download, try_to_load_from_cache
+from ..fileio import open_file
+from ..checkpoint import Checkpoint
+from .. import step_cache
+
+GLOTLID_REPO = "cis-lmu/glotlid"
+GLOTLID_FILE = "model.bin"
 
 def load_detector():
-	model_path = hf_hub_download(repo_id="cis-lmu/glotlid", filename="model.bin", cache_dir=None)
+	model_path = hf_hub_download(repo_id=GLOTLID_REPO, filename=GLOTLID_FILE, cache_dir=None)
 	model = fasttext.load_model(model_path)
 	return model
 
+def model_identity():
+	"""
+	What identifies the GlotLID model load_detector would use, for cache
+	keys: the hub file and a fingerprint of the locally cached copy (None
+	before the first download).
+	"""
+	cached = try_to_load_from_cache(repo_id=GLOTLID_REPO, filename=GLOTLID_FILE)
+	revision = step_cache.path_fingerprint(cached) if isinstance(cached, str) else None
+	return {"model": f"{GLOTLID_REPO}/{GLOTLID_FILE}", "revision": revision}
+
 def detect_with_glotlid(sentence, lang, detector):
 	predicted_languages, raw_probs = detector.predict(sentence, k=-1)
+	return _label_prob(predicted_languages, raw_probs, lang)
+
+def _label_prob(predicted_languages, raw_probs, lang):
 	target_label = f"__label__{lang}"
 	for label, prob in zip(predicted_languages, raw_probs):
 		if label == target_label:
 			return prob * 100  # convert to percentage if you prefer
 	return 0
 	
-def score(input_path, output_path, l1, l2):
-	glotlid_detector = load_detector()
+def score_line(line, detector, l1, l2, line_number=None):
+	"""
+	Append the l1/l2 language probabilities to one TSV line (without line
+	break). Returns the output line, or None if the line is skipped.
+	"""
+	if not line:
+		return None
+	try:
+		l1_sent, l2_sent, *rest = line.split("\t")
+	except ValueError:
+		print(f"[Warning] Skipping malformed line {line_number}: {line}")
+		return None
 
-	# Open input TSV and output TSV
-	with open(input_path, "r", encoding="utf-8") as infile, \
-		 open(output_path, "w", encoding="utf-8") as outfile:
+	l1_prob = detect_with_glotlid(l1_sent, l1, detector)
+	l2_prob = detect_with_glotlid(l2_sent, l2, detector)
 
-		header = infile.readline().rstrip("\n")
-		outfile.write(f"{header}\tl1_prob\tl2_prob\n")
+	fields = [l1_sent, l2_sent] + rest + [str(l1_prob), str(l2_prob)]
+	return "\t".join(fields)
 
-		for line_number, line in enumerate(infile, start=2):
-			line = line.rstrip("\n")
-			if not line:
-				continue
-			try:
-				l1_sent, l2_sent, *rest = line.split("\t")
-			except ValueError:
-				print(f"[Warning] Skipping malformed line {line_number}: {line}")
-				continue
+def score_lines(lines, detector, l1, l2, start=1):
+	"""
+	score_line for a list of lines, numbered from start: the l1 sentences
+	and the l2 sentences go to GlotLID as one batch each. Returns one output
+	line or None per line.
+	"""
+	split = []
+	for line_number, line in enumerate(lines, start=start):
+		if not line:
+			split.append(None)
+			continue
+		try:
+			l1_sent, l2_sent, *rest = line.split("\t")
+		except ValueError:
+			print(f"[Warning] Skipping malformed line {line_number}: {line}")
+			split.append(None)
+			continue
+		split.append((l1_sent, l2_sent, rest))
 
-			l1_prob = detect_with_glotlid(l1_sent, l1, glotlid_detector)
-			l2_prob = detect_with_glotlid(l2_sent, l2, glotlid_detector)
+	valid = [fields for fields in split if fields is not None]
+	if not valid:
+		return split
+	l1_preds = zip(*detector.predict([l1_sent for l1_sent, _, _ in valid], k=-1))
+	l2_preds = zip(*detector.predict([l2_sent for _, l2_sent, _ in valid], k=-1))
 
-			fields = [l1_sent, l2_sent] + rest + [str(l1_prob), str(l2_prob)]
-			outfile.write("\t".join(fields) + "\n")
+	scored = []
+	for fields in split:
+		if fields is None:
+			scored.append(None)
+			continue
+		l1_sent, l2_sent, rest = fields
+		l1_prob = _label_prob(*next(l1_preds), l1)
+		l2_prob = _label_prob(*next(l2_preds), l2)
+		scored.append("\t".join([l1_sent, l2_sent] + rest + [str(l1_prob), str(l2_prob)]))
+	return scored
+
+def score(input_path, output_path, l1, l2):
+	glotlid_detector = load_detector()
+
+	# Open input TSV and output TSV, resuming from a checkpoint if there is one
+	ckpt = Checkpoint("langid", output_path, input_path, params={"l1": l1, "l2": l2})
+	with open_file(input_path, "r", encoding="utf-8") as infile, ckpt, \
+		 ckpt.writer() as outfile:
+
+		header = infile.readline().rstrip("\n")
+		if not ckpt.resumed:
+			outfile.write(f"{header}\tl1_prob\tl2_prob\n")
 
+		for line_number, line in ckpt.rows(infile, start=2):
+			out_line = score_line(line.rstrip("\n"), glotlid_detector, l1, l2, line_number)
+			if out_line is not None:
+				outfile.write(out_line + "\n")
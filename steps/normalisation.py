@@ -1,13 +1,21 @@
 from pathlib import Path
 import importlib
 from normalisation.core import core_normalise
+from .fileio import open_file, TSVWriter
 
-def get_normaliser(lang_code):
-    """Dynamically load a normaliser for a given language, fallback to default."""
+NORMALISED_HEADER = "l1_orig\tl1_norm\tl2_orig\tl2_norm"
+
+def normaliser_module(lang_code):
+    """The normalisation module for a language, normalisation.default if it has none."""
     try:
-        lang_module = importlib.import_module(f"normalisation.{lang_code}")
+        return importlib.import_module(f"normalisation.{lang_code}")
     except ImportError:
-        lang_module = importlib.import_module("normalisation.default")
+        return importlib.import_module("normalisation.default")
+
+
+def get_normaliser(lang_code):
+    """Dynamically load a normaliser for a given language, fallback to default."""
+    lang_module = normaliser_module(lang_code)
 
     def normalise(text: str, source: str = "") -> str:
         text = core_normalise(text, source)
@@ -18,6 +26,22 @@ def get_normaliser(lang_code):
     return normalise
 
 
+def normalise_line(line, l1_norm, l2_norm, line_number=None):
+    """
+    Turn one (l1, l2) TSV line (without line break) into
+    l1_orig, l1_norm, l2_orig, l2_norm. Returns None if the line is skipped.
+    """
+    parts = line.split("\t")
+    if len(parts) < 2:
+        print(f"[Warning] Skipping malformed line {line_number}: {line.strip()}")
+        return None
+
+    l1_sent, l2_sent = parts[0], parts[1]
+    norm_l1 = l1_norm(l1_sent, source=l2_sent)
+    norm_l2 = l2_norm(l2_sent, source=l1_sent)
+    return f"{l1_sent}\t{norm_l1}\t{l2_sent}\t{norm_l2}"
+
+
 def apply_normalisation(input_path, output_path, l1, l2, with_header=True):
     """
     Read 2-column TSV (l1, l2) from file, 
@@ -26,22 +50,15 @@ def apply_normalisation(input_path, output_path, l1, l2, with_header=True):
     l1_norm = get_normaliser(l1)
     l2_norm = get_normaliser(l2)
 
-    with open(input_path, "r", encoding="utf-8") as infile, \
-         open(output_path, "w", encoding="utf-8") as outfile:
+    with open_file(input_path, "r", encoding="utf-8") as infile, \
+         TSVWriter(output_path, "normalise") as outfile:
 
         if with_header:
-            outfile.write("l1_orig\tl1_norm\tl2_orig\tl2_norm\n")
+            outfile.write(NORMALISED_HEADER + "\n")
 
         for line_number, line in enumerate(infile, start=1):
-            parts = line.rstrip("\n").split("\t")
-            if len(parts) < 2:
-                print(f"[Warning] Skipping malformed line {line_number}: {line.strip()}")
-                continue
-
-            l1_sent, l2_sent = parts[0], parts[1]
-            norm_l1 = l1_norm(l1_sent, source=l2_sent)
-            norm_l2 = l2_norm(l2_sent, source=l1_sent)
-
-            outfile.write(f"{l1_sent}\t{norm_l1}\t{l2_sent}\t{norm_l2}\n")
+            out_line = normalise_line(line.rstrip("\n"), l1_norm, l2_norm, line_number)
+            if out_line is not None:
+                outfile.write(out_line + "\n")
 
     return output_path
\ No newline at end of file
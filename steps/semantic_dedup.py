@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+from .fileio import open_file, TSVWriter
+
+# Approximate semantic deduplication over the pair vectors written by
+# embeddings.add_embeddings. Vectors are bucketed with random-projection LSH
+# (several independent tables of sign bits); only pairs sharing a bucket are
+# compared, so the full similarity matrix is never built.
+
+# rounds of re-hashing an oversized bucket before falling back to chunks
+MAX_REHASH = 4
+
+def parse_scores(header, lines, score_column="cosine_similarity"):
+    """Return one score per data line below header (used to pick cluster representatives)."""
+    header = header.rstrip("\r\n").split("\t")
+    col = header.index(score_column) if score_column in header else 2
+    scores = []
+    for line in lines:
+        parts = line.rstrip("\r\n").split("\t")
+        try:
+            scores.append(float(parts[col]))
+        except (IndexError, ValueError):
+            scores.append(0.0)
+    return np.asarray(scores, dtype=np.float32)
+
+def read_scores(tsv_path, score_column="cosine_similarity"):
+    """Return one score per data row of a TSV."""
+    with open_file(tsv_path, "r", encoding="utf-8") as f_in:
+        return parse_scores(next(f_in), f_in, score_column)
+
+def open_vectors(vectors_path, n_rows, dim, dtype=np.float16):
+    """Memory-map the raw vector file as an (n_rows, dim) array."""
+    itemsize = np.dtype(dtype).itemsize
+    size = os.path.getsize(vectors_path)
+    if size != n_rows * dim * itemsize:
+        raise ValueError(
+            f"{vectors_path} ({size} bytes) does not hold one {dim}-dim vector per row "
+            f"of a {n_rows}-row TSV; was a row-dropping step run after embeddings?"
+        )
+    return np.memmap(vectors_path, dtype=dtype, mode="r", shape=(n_rows, dim))
+
+def lsh_signatures(vectors, n_bits=16, n_tables=8, block_size=65536, seed=0):
+    """
+    Stream the vectors in blocks and return an (n_rows, n_tables) array of
+    n_bits-wide random hyperplane signatures.
+    """
+    n_rows, dim = vectors.shape
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((dim, n_bits * n_tables)).astype(np.float32)
+    weights = (1 << np.arange(n_bits, dtype=np.uint32)).astype(np.uint32)
+    keys = np.empty((n_rows, n_tables), dtype=np.uint32)
+    for start in range(0, n_rows, block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        bits = (block @ planes > 0).reshape(len(block), n_tables, n_bits)
+        keys[start:start + len(block)] = bits.astype(np.uint32) @ weights
+    return keys
+
+def find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+def union_similar(vectors, idx, threshold, parent):
+    """Compare all members of one bucket and union those above threshold."""
+    idx = np.sort(idx)  # sequential reads from the memmap
+    block = np.asarray(vectors[idx], dtype=np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    block /= norms
+    sims = block @ block.T
+    rows, cols = np.nonzero(np.triu(sims >= threshold, k=1))
+    for a, b in zip(idx[rows], idx[cols]):
+        ra, rb = find(parent, a), find(parent, b)
+        if ra != rb:
+            parent[rb] = ra
+
+def split_bucket(vectors, idx, max_bucket, n_bits=16, seed=0):
+    """
+    Split an oversized bucket into parts of at most max_bucket rows by
+    re-hashing its rows with fresh hyperplanes. Rows that still share a key
+    after MAX_REHASH rounds are near-identical; they are compared in chunks
+    overlapping by half, so duplicates among them are only linked through
+    neighbouring chunks. Returns (parts, number of rows chunked).
+    """
+    parts, chunked = [], 0
+    pending = [(np.sort(idx), 0)]
+    while pending:
+        idx, depth = pending.pop()
+        if len(idx) <= max_bucket:
+            parts.append(idx)
+        elif depth < MAX_REHASH:
+            keys = lsh_signatures(vectors[idx], n_bits, 1, seed=seed + depth + 1)[:, 0]
+            order = np.argsort(keys, kind="stable")
+            bounds = np.flatnonzero(np.diff(keys[order])) + 1
+            pending.extend((np.sort(part), depth + 1) for part in np.split(idx[order], bounds))
+        else:
+            step = max_bucket // 2
+            parts.extend(idx[cs:cs + 2 * step] for cs in range(0, len(idx) - step, step))
+            chunked += len(idx)
+    return parts, chunked
+
+def cluster(vectors, threshold=0.95, n_bits=16, n_tables=8, block_size=65536,
+            max_bucket=2048, seed=0):
+    """Return the cluster root of every row."""
+    n_rows = vectors.shape[0]
+    keys = lsh_signatures(vectors, n_bits, n_tables, block_size, seed)
+    parent = np.arange(n_rows, dtype=np.int64)
+
+    for t in range(n_tables):
+        order = np.argsort(keys[:, t], kind="stable")
+        sorted_keys = keys[order, t]
+        bounds = np.flatnonzero(np.diff(sorted_keys)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [n_rows]))
+        split = chunked = 0
+        for s, e in zip(starts, ends):
+            parts = [order[s:e]]
+            if e - s > max_bucket:
+                # bound the size of the similarity matrix of a bucket
+                parts, n = split_bucket(vectors, order[s:e], max_bucket, n_bits, seed + (t + 1) * MAX_REHASH)
+                split += 1
+                chunked += n
+            for part in parts:
+                if len(part) > 1:
+                    union_similar(vectors, part, threshold, parent)
+        print(f"[semantic_dedup] LSH table {t + 1}/{n_tables} done")
+        if split:
+            print(f"[semantic_dedup] Re-hashed {split} buckets over {max_bucket} rows"
+                  + (f"; {chunked} near-identical rows compared in overlapping chunks" if chunked else ""))
+
+    # flatten to roots by pointer jumping
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            return parent
+        parent = grand
+
+def representatives(vectors, scores, threshold=0.95, n_bits=16, n_tables=8,
+                    block_size=65536, max_bucket=2048, seed=0):
+    """Mask of the rows to keep: the best-scoring row of every cluster (ties -> earliest row)."""
+    n_rows = len(scores)
+    roots = cluster(vectors, threshold, n_bits, n_tables, block_size, max_bucket, seed)
+    order = np.lexsort((np.arange(n_rows), -scores, roots))
+    first = np.ones(n_rows, dtype=bool)
+    first[1:] = roots[order][1:] != roots[order][:-1]
+    keep = np.zeros(n_rows, dtype=bool)
+    keep[order[first]] = True
+    return keep
+
+def semantic_dedup(tsv_path: str, vectors_path: str, out_path: str,
+                   threshold: float = 0.95, n_bits: int = 16, n_tables: int = 8,
+                   block_size: int = 65536, max_bucket: int = 2048, seed: int = 0,
+                   dim: int = 768, kept_vectors_path: str = None):
+    """
+    Drop paraphrase-level duplicates: pairs whose vectors have cosine >= threshold
+    are clustered and only the row with the highest cosine_similarity is kept.
+    Output keeps the original row order.
+    dim: dimension of the pair vectors (that of the embedding model)
+    kept_vectors_path: if given, the vectors of the kept rows are written
+    there, so that later steps get vectors aligned with the output.
+    """
+    scores = read_scores(tsv_path)
+    n_rows = len(scores)
+    if n_rows == 0:
+        with open_file(tsv_path, "r", encoding="utf-8") as f_in, \
+             TSVWriter(out_path, "semantic_dedup") as f_out:
+            f_out.write(next(f_in, ""))
+        if kept_vectors_path:
+            open(kept_vectors_path, "wb").close()
+        return out_path
+
+    vectors = open_vectors(vectors_path, n_rows, dim)
+    keep = representatives(vectors, scores, threshold, n_bits, n_tables, block_size, max_bucket, seed)
+
+    with open_file(tsv_path, "r", encoding="utf-8") as f_in, \
+         TSVWriter(out_path, "semantic_dedup") as f_out:
+        f_out.write(next(f_in))
+        for row, line in enumerate(f_in):
+            if keep[row]:
+                f_out.write(line)
+
+    if kept_vectors_path:
+        with open(kept_vectors_path, "wb") as f_vec:
+            for start in range(0, n_rows, block_size):
+                block = vectors[start:start + block_size]
+                f_vec.write(np.ascontiguousarray(block[keep[start:start + block_size]]).tobytes())
+
+    print(f"[semantic_dedup] Kept {int(keep.sum())} of {n_rows} pairs")
+    return out_path
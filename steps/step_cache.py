@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import os
+import sys
+import glob
+import json
+import inspect
+import xxhash
+from . import fileio
+
+# Content-hash caching of step outputs. Every run_pipeline output prefix gets
+# a <prefix>.run.json manifest that records, per step, the fingerprint of
+# what produced its outputs (input content, step parameters, model, code)
+# and the fingerprints of the outputs themselves. A step whose fingerprint
+# matches and whose outputs are unchanged on disk is skipped.
+#
+# Files are fingerprinted from their size plus SAMPLE_BLOCKS evenly spaced
+# blocks (the whole file when it is small), so a cache check reads a few MB
+# whatever the file size. An edit that keeps the size and falls between the
+# sampled blocks goes unnoticed; set FULL_HASH to stream whole files instead.
+
+SAMPLE_BLOCKS = 64
+BLOCK_SIZE = 1 << 16
+FULL_HASH = False
+MANIFEST_SUFFIX = ".run.json"
+# the repository: only source files below it count as step code
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_code_versions = {}
+
+
+def file_fingerprint(path):
+    """Sampled (or, with FULL_HASH, streamed) xxhash of one file."""
+    if path.endswith(fileio.MANIFEST_SUFFIX):
+        manifest = fileio.read_manifest(path)
+        return fingerprint(header=manifest["header"], parts=[file_fingerprint(p) for p in manifest["parts"]])
+    size = os.path.getsize(path)
+    h = xxhash.xxh64(str(size))
+    with open(path, "rb") as f:
+        if FULL_HASH or size <= SAMPLE_BLOCKS * BLOCK_SIZE:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        else:
+            stride = (size - BLOCK_SIZE) // (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                f.seek(i * stride)
+                h.update(f.read(BLOCK_SIZE))
+    return h.hexdigest()
+
+
+def path_fingerprint(paths):
+    """
+    Fingerprint of step inputs: a path or list of paths, where a path may be
+    a file, a directory (e.g. a dedup index), a glob or an archive.zip::member.
+    """
+    if paths is None:
+        return None
+    if isinstance(paths, (list, tuple)):
+        return fingerprint(paths=[path_fingerprint(p) for p in paths])
+    path = paths.split("::")[0]
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        return fingerprint(files=[(os.path.relpath(f, path), file_fingerprint(f)) for f in files])
+    if os.path.exists(path):
+        return file_fingerprint(path)
+    return fingerprint(glob=paths, files=[file_fingerprint(f) for f in sorted(glob.glob(path))])
+
+
+def _source_file(obj):
+    """The repository source file defining obj (a module, function or class), or None."""
+    module = obj if inspect.ismodule(obj) else sys.modules.get(getattr(obj, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    if not path.startswith(ROOT + os.sep) or "site-packages" in path:
+        return None
+    return path
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def source_files(obj, found=None, seen=None):
+    """
+    The repository source files obj depends on: the file defining it and,
+    transitively, those defining the repository functions, classes and
+    modules it refers to (for a function, the globals its code names; for a
+    module, everything it imports).
+    """
+    found = set() if found is None else found
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return found
+    seen.add(id(obj))
+    path = _source_file(obj)
+    if path is None:
+        return found
+    found.add(path)
+    if inspect.ismodule(obj):
+        refs = list(vars(obj).values())
+    elif inspect.isclass(obj):
+        refs = list(vars(obj).values())
+    elif hasattr(obj, "__code__"):
+        refs = [obj.__globals__[n] for n in _code_names(obj.__code__) if n in obj.__globals__]
+    else:
+        refs = []
+    # registries such as input_formats.format_classes
+    refs += [v for ref in refs if isinstance(ref, (dict, list, tuple))
+             for v in (ref.values() if isinstance(ref, dict) else ref)]
+    for ref in refs:
+        if isinstance(ref, (staticmethod, classmethod)):
+            ref = ref.__func__
+        if inspect.ismodule(ref) or inspect.isclass(ref) or inspect.isfunction(ref):
+            source_files(ref, found, seen)
+    return found
+
+
+def code_version(obj):
+    """Hash of the source files a step function (or module) depends on, see source_files."""
+    parts = []
+    for path in sorted(source_files(obj)):
+        if path not in _code_versions:
+            with open(path, "rb") as f:
+                _code_versions[path] = xxhash.xxh64(f.read()).hexdigest()
+        parts.append((os.path.relpath(path, ROOT), _code_versions[path]))
+    return fingerprint(files=parts)
+
+
+def fingerprint(**parts):
+    return xxhash.xxh64(json.dumps(parts, sort_keys=True, default=str)).hexdigest()
+
+
+class RunManifest:
+
+    def __init__(self, prefix):
+        self.path = prefix + MANIFEST_SUFFIX
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.steps = json.load(f)["steps"]
+        except (OSError, ValueError, KeyError):
+            self.steps = {}
+
+    def lookup(self, key, fp):
+        """The entry recorded for key if it was made with fingerprint fp and its outputs are unchanged."""
+        entry = self.steps.get(key)
+        if not entry or entry["fingerprint"] != fp:
+            return None
+        for path, h in entry["outputs"].items():
+            if not os.path.exists(path) or file_fingerprint(path) != h:
+                return None
+        return entry
+
+    def record(self, key, fp, output, extra_outputs=()):
+        """Record the outputs of key (output is the TSV the next step reads)."""
+        paths = [output] + [p for p in extra_outputs if os.path.exists(p)]
+        entry = {"fingerprint": fp, "output": output,
+                 "outputs": {p: file_fingerprint(p) for p in paths}}
+        self.steps[key] = entry
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"steps": self.steps}, f, indent=2)
+        os.replace(tmp, self.path)
+        return entry
@@ -0,0 +1,36 @@
+import os
+import sys
+import zlib
+import numpy as np
+import pytest
+
+# the tests import the top-level modules (cleaner, server, pipeline) like pipeline.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cleaner
+from steps import embeddings
+from steps.langid import langid
+
+
+class FakeModel:
+	"""Deterministic sentence vectors, so no embedding model is downloaded."""
+
+	def encode(self, sentences, batch_size=None):
+		return np.array([np.random.default_rng(zlib.crc32(s.encode())).standard_normal(8) for s in sentences])
+
+
+class FakeDetector:
+	"""GlotLID stand-in: every sentence is eng_Latn with 0.9, cat_Latn with 0.1."""
+
+	def predict(self, sentences, k=-1):
+		prediction = (["__label__eng_Latn", "__label__cat_Latn"], np.array([0.9, 0.1]))
+		if isinstance(sentences, list):
+			return [prediction[0]] * len(sentences), [prediction[1]] * len(sentences)
+		return prediction
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+	monkeypatch.setattr(embeddings, "load_embedding_model", lambda name, model_path=None: FakeModel())
+	monkeypatch.setattr(cleaner, "load_detector", FakeDetector)
+	monkeypatch.setattr(langid, "load_detector", FakeDetector)
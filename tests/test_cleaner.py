@@ -0,0 +1,37 @@
+import pytest
+import cleaner
+
+
+PAIRS = [("Hello world", "Hola món"), ("Good   morning", "Bon dia"), ("", "buit")]
+
+
+def test_normalise_returns_the_pair_and_its_normalised_text():
+	c = cleaner.Cleaner({"l1": "eng_Latn", "l2": "cat_Latn", "steps": ["input", "normalise"]})
+	results = list(c.process_tagged((i, l1, l2) for i, (l1, l2) in enumerate(PAIRS)))
+
+	assert [tag for tag, _, _ in results] == [0, 1]
+	for tag, text, scores in results:
+		assert (text["l1"], text["l2"]) == PAIRS[tag]
+		assert {"l1_norm", "l2_norm"} <= set(text)
+		assert scores == {}
+	assert [(l1, l2) for l1, l2, _ in c.process(PAIRS)] == PAIRS[:2]
+
+
+def test_filter_keeps_the_scores_of_surviving_pairs(fake_models):
+	c = cleaner.Cleaner({"l1": "eng_Latn", "l2": "cat_Latn", "steps": ["input", "embeddings", "langid", "filter"],
+						 "alignment_score": -1.0, "langid_l1_prob": 50, "langid_l2_prob": 0})
+	results = list(c.process(PAIRS))
+
+	assert [(l1, l2) for l1, l2, _ in results] == PAIRS[:2]
+	for _, _, scores in results:
+		assert set(scores) == {"cosine_similarity", "l1_prob", "l2_prob"}
+		assert scores["l1_prob"] == pytest.approx(90)
+
+
+def test_normalise_after_filter_keeps_scores(fake_models):
+	c = cleaner.Cleaner({"l1": "eng_Latn", "l2": "cat_Latn",
+						 "steps": ["input", "embeddings", "langid", "filter", "normalise"],
+						 "alignment_score": -1.0, "langid_l1_prob": 0, "langid_l2_prob": 0})
+	for tag, text, scores in c.process_tagged((i, l1, l2) for i, (l1, l2) in enumerate(PAIRS)):
+		assert (text["l1"], text["l2"]) == PAIRS[tag]
+		assert set(scores) == {"cosine_similarity", "l1_prob", "l2_prob"}
@@ -0,0 +1,65 @@
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from steps import input_formats
+from steps.fileio import open_file
+
+
+TMX = """<?xml version="1.0" encoding="UTF-8"?>
+<tmx version="1.4"><header/><body>
+<tu><tuv xml:lang="en"><seg>a&#13;b&#9;c</seg></tuv><tuv xml:lang="es"><seg>d
+e</seg></tuv></tu>
+</body></tmx>
+"""
+
+
+def test_producers_clean_fields_the_same_way(tmp_path):
+	tmx_path = tmp_path / "in.tmx"
+	tmx_path.write_text(TMX, encoding="utf-8")
+	jsonl_path = tmp_path / "in.jsonl"
+	jsonl_path.write_text(json.dumps({"src": "a\rb\tc", "tgt": "d\ne", "score": "0.5\t"}) + "\n", encoding="utf-8")
+
+	cases = [
+		([str(tmx_path)], "tmx", {}, ["a b c\td e"]),
+		([str(jsonl_path)], "jsonl", {"score_columns": {"score": "score"}}, ["a b c\td e\t0.5 "]),
+	]
+	for inputs, input_format, kwargs, expected in cases:
+		output = str(tmp_path / f"{input_format}.formatted.tsv")
+		input_formats.run(inputs, "en", "es", input_format, output, **kwargs)
+		with open_file(output, "r", encoding="utf-8") as f:
+			written = f.read().split("\n")[1:-1]
+		_, rows = input_formats.read_rows(inputs, "en", "es", input_format, **kwargs)
+
+		assert written == expected
+		assert list(rows) == expected
+
+
+def write_docs_zip(path, n):
+	with zipfile.ZipFile(path, "w") as archive:
+		for i in range(n):
+			archive.writestr(f"docs/{i:02d}.en", f"hello {i}\n")
+			archive.writestr(f"docs/{i:02d}.es", f"hola {i}\n")
+
+
+def test_empty_glob_fails_before_the_output_is_created(tmp_path):
+	archive = tmp_path / "docs.zip"
+	write_docs_zip(archive, 2)
+	output = tmp_path / "out.formatted.tsv"
+
+	with pytest.raises(ValueError, match="matches no files"):
+		input_formats.run([f"{archive}::docs/*.en", f"{archive}::docs/*.fr"], "en", "es", "plain_text", str(output))
+	assert list(tmp_path.iterdir()) == [archive]
+
+
+def test_readers_of_one_archive_do_not_close_each_other(tmp_path):
+	archive = tmp_path / "docs.zip"
+	write_docs_zip(archive, 40)
+	inputs = [f"{archive}::docs/*.en", f"{archive}::docs/*.es"]
+	expected = [(f"hello {i}", f"hola {i}") for i in range(40)]
+
+	def read(_):
+		return list(input_formats.plain_text(inputs, None, "plain_text", "en", "es", workers=2).read())
+
+	with ThreadPoolExecutor(max_workers=4) as pool:
+		assert list(pool.map(read, range(40))) == [expected] * 40
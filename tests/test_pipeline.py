@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import pipeline
+from steps import embeddings
+from steps.langid import langid
+from conftest import FakeModel
+
+
+# "broken" (one field) is skipped by both steps; extra columns are kept
+INPUT = "eng_Latn\tcat_Latn\nHello\tHola\nbroken\na\tb\tc\nBye\tAdeu\n"
+
+
+def run_step(step, input_path, output_path):
+	if step == "embeddings":
+		embeddings.add_embeddings(input_path, output_path, FakeModel(), "eng_Latn", "cat_Latn",
+								  vectors_path=embeddings.vectors_path(output_path))
+	else:
+		langid.score(input_path, output_path, "eng_Latn", "cat_Latn")
+	return output_path
+
+
+@pytest.mark.parametrize("stage", [["embeddings", "langid"], ["langid", "embeddings"]])
+def test_joined_branches_match_a_sequential_run_with_malformed_rows(tmp_path, fake_models, stage):
+	source = tmp_path / "in.tsv"
+	source.write_text(INPUT, encoding="utf-8")
+
+	current = str(source)
+	for step in stage:
+		current = run_step(step, current, str(tmp_path / f"seq.{step}.tsv"))
+	branches = [run_step(step, str(source), str(tmp_path / f"branch.{step}.tsv")) for step in stage]
+	joined = str(tmp_path / "joined.tsv")
+	n_added = [len(pipeline.STEP_COLUMNS[step]["adds"]) for step in stage]
+	rows, dropped = pipeline.join_columns(str(source), branches, n_added, joined)
+
+	with open(current, encoding="utf-8") as f:
+		expected = f.read()
+	with open(joined, encoding="utf-8") as f:
+		assert f.read() == expected
+	assert len(expected.splitlines()) == 4
+	assert (rows, dropped) == (3, [])
+
+
+def test_rows_skipped_by_one_branch_are_left_out(tmp_path, fake_models):
+	source = tmp_path / "in.tsv"
+	source.write_text(INPUT, encoding="utf-8")
+	# langid reads a copy in which "Hello" is malformed, so only embeddings keeps that row
+	damaged = tmp_path / "damaged.tsv"
+	damaged.write_text(INPUT.replace("Hello\tHola", "Hello Hola"), encoding="utf-8")
+	branches = [run_step("langid", str(damaged), str(tmp_path / "branch.langid.tsv")),
+				run_step("embeddings", str(source), str(tmp_path / "branch.embeddings.tsv"))]
+	joined = str(tmp_path / "joined.tsv")
+
+	rows, dropped = pipeline.join_columns(str(source), branches, [2, 1], joined)
+
+	with open(joined, encoding="utf-8") as f:
+		assert [line.split("\t")[:2] for line in f.read().splitlines()[1:]] == [["a", "b"], ["Bye", "Adeu"]]
+	assert (rows, dropped) == (3, [0])
+
+
+def test_drop_vector_rows(tmp_path):
+	path = str(tmp_path / "x.vec")
+	np.arange(12, dtype=np.float16).tofile(path)
+	embeddings.drop_vector_rows(path, 4, [1, 3])
+	assert np.fromfile(path, dtype=np.float16).tolist() == [0, 1, 2, 6, 7, 8]
@@ -0,0 +1,31 @@
+import asyncio
+import json
+from cleaner import Cleaner
+from server import MicroBatcher, CleanServer
+
+
+def clean(config, pairs):
+	"""POST pairs to /clean of a server around a Cleaner for config, without a socket."""
+
+	async def request():
+		batcher = MicroBatcher(Cleaner(config), max_batch=4, max_wait_ms=1)
+		worker = asyncio.create_task(batcher.run())
+		try:
+			return await CleanServer(batcher).route("POST", "/clean", json.dumps({"pairs": pairs}))
+		finally:
+			worker.cancel()
+
+	return asyncio.run(request())
+
+
+def test_clean_with_normalise_returns_the_submitted_pairs():
+	pairs = [["hello world 0", "bonjour 0"], ["Good   morning", "Bon dia"]]
+	status, payload = clean({"l1": "eng_Latn", "l2": "fra_Latn", "steps": ["input", "normalise"]}, pairs)
+
+	assert status == "200 OK"
+	returned = payload["pairs"]
+	assert [r["index"] for r in returned] == [0, 1]
+	for r in returned:
+		assert [r["l1"], r["l2"]] == pairs[r["index"]]
+		assert {"l1_norm", "l2_norm"} <= set(r)
+		assert r["scores"] == {}